@@ -0,0 +1,98 @@
+"""
+Compares the size and read throughput of the cache compression formats.
+
+Usage (from `src`): python -m benchmarks.cache_compression [--pages 20] [--rounds 5]
+"""
+import argparse
+import json
+import tempfile
+import time
+import uuid
+
+from rich.console import Console
+from rich.table import Table
+
+from utils.cache_backends import FileSystemCacheBackend
+from utils.codec import Compression, compress, decompress, loads, zstandard
+
+
+def make_page(page: int, limit: int) -> dict:
+    # shaped like a `/v2/items?limit=500` page of the Wiki API
+    return {
+        'data': [
+            {
+                'uuid': str(uuid.uuid4()),
+                'name': f"Item {page}-{index}",
+                'type': 'PowerPlant',
+                'sub_type': 'Power',
+                'is_base_variant': index % 3 == 0,
+                'manufacturer': {
+                    'name': 'Lightning Power Ltd.',
+                    'code': 'LPLT',
+                    'link': 'https://api.star-citizen.wiki/api/v2/manufacturers/Lightning+Power+Ltd.',
+                },
+                'link': f"https://api.star-citizen.wiki/api/v2/items/{uuid.uuid4()}",
+                'updated_at': '2025-02-21T04:41:17.000000Z',
+                'version': '4.0.1-LIVE.9499080',
+            }
+            for index in range(limit)
+        ],
+        'links': {'first': '', 'last': '', 'prev': None, 'next': None},
+        'meta': {'current_page': page, 'from': 1, 'last_page': 1, 'path': '', 'per_page': limit, 'to': 1,
+                 'total': limit},
+    }
+
+
+def benchmark(compression: Compression, pages: list[bytes], rounds: int) -> tuple[int, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        backend = FileSystemCacheBackend(directory)
+        urls = [f"https://api.star-citizen.wiki/api/v2/items?limit=500&page={page}" for page in range(len(pages))]
+
+        for url, contents in zip(urls, pages):
+            backend.write(url, compress(contents, compression))
+
+        size = sum(len(backend.read(url)) for url in urls)
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for url in urls:
+                loads(decompress(backend.read(url)))
+        elapsed = time.perf_counter() - start
+
+        return size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = [json.dumps(make_page(page, args.limit)).encode('utf-8') for page in range(args.pages)]
+    raw_size = sum(len(page) for page in pages)
+
+    table = Table(title=f"Cache compression ({args.pages} pages x {args.limit} entries, {args.rounds} rounds)")
+    for column in ["Format", "Size", "Ratio", "Read MB/s (uncompressed)", "Read ms/page"]:
+        table.add_column(column, justify="right")
+
+    for compression in Compression:
+        if compression == Compression.ZSTD and zstandard is None:
+            table.add_row(compression.value, "-", "-", "zstandard not installed", "-")
+            continue
+
+        size, elapsed = benchmark(compression, pages, args.rounds)
+        reads = args.pages * args.rounds
+        table.add_row(
+            compression.value,
+            f"{size / 1024:.0f} KiB",
+            f"{raw_size / size:.2f}x",
+            f"{raw_size * args.rounds / elapsed / 1024 / 1024:.1f}",
+            f"{elapsed / reads * 1000:.2f}",
+        )
+
+    Console().print(table)
+
+
+if __name__ == '__main__':
+    main()
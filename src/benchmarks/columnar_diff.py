@@ -0,0 +1,91 @@
+"""
+Compares the scalar and the NumPy columnar diff of matched source/target values.
+
+Usage (from `src`): python -m benchmarks.columnar_diff [--entities 10000 100000] [--rounds 5]
+"""
+import argparse
+import random
+import time
+from typing import Any, Callable
+
+from rich.console import Console
+from rich.table import Table
+
+from utils.diff import DiffMode, diff, numpy
+
+# numeric fields of the vehicle mapping in `main.py`, plus the string fields `uuid` and `crew`
+FIELDS = ['uuid', 'scu', 'crew', 'mass', 'width', 'height', 'length', 'fuel_quantum', 'fuel_hydrogen']
+
+
+def make_rows(entities: int) -> tuple[list[list[Any]], list[list[Any]]]:
+    rng = random.Random(entities)
+    source_rows = []
+    target_rows = []
+
+    for index in range(entities):
+        source = [
+            f"00000000-0000-0000-0000-{index:012d}",
+            float(rng.randrange(0, 96)),
+            '1,2',
+            rng.uniform(1_000, 100_000),
+            rng.uniform(5, 50),
+            rng.uniform(5, 50),
+            rng.uniform(5, 100),
+            None if index % 5 == 0 else rng.uniform(0, 10),
+            rng.choice([0.0, 400.0, 800.0]),
+        ]
+        # most values already match, some differ slightly or are missing
+        target = [
+            None if index % 2 else value if not isinstance(value, float) else
+            value + rng.choice([0.0, 0.0, 0.0, 1e-6, 1.0])
+            for value in source
+        ]
+        source_rows.append(source)
+        target_rows.append(target)
+
+    return source_rows, target_rows
+
+
+def measure(function: Callable[[], list[list[bool]]], rounds: int) -> tuple[list[list[bool]], float]:
+    result = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function()
+
+    return result, (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entities', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=1e-3)
+    args = parser.parse_args()
+
+    table = Table(title=f"Diff ({len(FIELDS)} fields, tolerance {args.tolerance}, {args.rounds} rounds)")
+    for column in ["Entities", "Mode", "ms/run", "µs/entity", "Speedup"]:
+        table.add_column(column, justify="right")
+
+    for entities in args.entities:
+        source_rows, target_rows = make_rows(entities)
+        scalar, scalar_elapsed = measure(
+            lambda: diff(source_rows, target_rows, DiffMode.SCALAR, args.tolerance), args.rounds)
+        table.add_row(str(entities), DiffMode.SCALAR.value, f"{scalar_elapsed * 1000:.1f}",
+                      f"{scalar_elapsed / entities * 1_000_000:.2f}", "1.00x")
+
+        if numpy is None:
+            table.add_row(str(entities), DiffMode.COLUMNAR.value, "numpy not installed", "-", "-")
+            continue
+
+        columnar, columnar_elapsed = measure(
+            lambda: diff(source_rows, target_rows, DiffMode.COLUMNAR, args.tolerance), args.rounds)
+        assert columnar == scalar
+
+        table.add_row(str(entities), DiffMode.COLUMNAR.value, f"{columnar_elapsed * 1000:.1f}",
+                      f"{columnar_elapsed / entities * 1_000_000:.2f}", f"{scalar_elapsed / columnar_elapsed:.2f}x")
+
+    Console().print(table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Measures the submissions per minute of the HTTP submission backend against a local stand-in of the UEX edit form.
+The stand-in rejects submissions missing any field the browser would post, so it also checks the posted form.
+
+Usage (from `src`): python -m benchmarks.form_submission [--submissions 200] [--concurrency 1 4] [--screenshots 3]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from rich.console import Console
+from rich.table import Table
+
+from updaters.submission import AGREEMENT_ID, SUBMIT_BUTTON_TITLE, HttpSubmissionBackend
+from utils.http import Transport
+
+EDIT_PATH = "/data/submit/type/request"
+SUBMITTED_PATH = "/data/home/type/request/ids_highlighted//"
+SESSION_COOKIE = "uex_session=benchmark"
+
+# the fields of the real edit form the updater fills in, next to a token and fields it leaves untouched
+FORM_HTML = f"""<!DOCTYPE html>
+<html><body>
+<form action="{EDIT_PATH}" method="post" enctype="multipart/form-data">
+    <input type="hidden" name="token" value="d41d8cd98f00b204">
+    <input type="hidden" name="id_reference" value="1">
+    <input type="text" name="request_data[uuid]" value="">
+    <input type="text" name="request_data[scu]" value="0">
+    <input type="text" name="request_data[mass]" value="0">
+    <input type="text" name="request_data[width]" value="0">
+    <select name="request_data[size]"><option value="S">S</option><option value="M" selected>M</option></select>
+    <input type="text" name="details" value="">
+    <button type="button" id="btn_screenshot_attach">Attach</button>
+    <input type="file" name="screenshots[]" accept="image/*" multiple style="display: none">
+    <input type="checkbox" name="agreement" id="{AGREEMENT_ID}" value="1">
+    <label for="{AGREEMENT_ID}">I agree</label>
+    <button type="submit" name="action" value="submit" title="{SUBMIT_BUTTON_TITLE}">Submit</button>
+</form>
+</body></html>
+""".encode()
+
+REQUIRED_FIELDS = ['token', 'id_reference', 'request_data[uuid]', 'request_data[size]', 'details', 'agreement',
+                   'action']
+
+
+class StandInFormHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, delayed ACKs would otherwise stall every kept-alive response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == SUBMITTED_PATH:
+            self.respond(200, b"<html><body>Submitted</body></html>")
+        elif path == EDIT_PATH and SESSION_COOKIE in self.headers.get('Cookie', ''):
+            self.respond(200, FORM_HTML)
+        else:
+            self.respond(403, b"Not logged in")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+
+        fields = {part.get_param('name', header='content-disposition') for part in message.iter_parts()}
+        screenshots = [part for part in message.iter_parts() if part.get_filename()]
+
+        if any(name not in fields for name in REQUIRED_FIELDS) or len(screenshots) == 0:
+            self.respond(400, b"Missing fields")
+            return
+
+        self.send_response(302)
+        self.send_header('Location', SUBMITTED_PATH)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def respond(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_screenshots(directory: str, count: int, size: int) -> list[str]:
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"proof_{index}.png")
+        with open(path, 'wb') as file:
+            file.write(os.urandom(size))
+        paths.append(path)
+
+    return paths
+
+
+async def submit_all(base_url: str, submissions: int, concurrency: int, screenshot_paths: list[str]) -> int:
+    backend = HttpSubmissionBackend(base_url, transport=Transport(pool_size=concurrency, max_retries=0))
+    host = urlparse(base_url).hostname
+    name, value = SESSION_COOKIE.split('=')
+    # stands in for the cookies copied from the browser profile in `start`
+    backend.transport.session.cookies.set(name, value, domain=host, path='/')
+
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for index in range(submissions):
+        queue.put_nowait(index)
+
+    submitted = 0
+
+    async def worker():
+        nonlocal submitted
+        while not queue.empty():
+            index = queue.get_nowait()
+            form = await backend.load_form(None, backend.get_edit_url("vehicles", index))
+            await backend.fill(form, {
+                'request_data[uuid]': f"00000000-0000-0000-0000-{index:012d}",
+                'request_data[mass]': str(index * 1000.0),
+                'details': "[AUTOMATED UPDATE] Updated Fields: uuid, mass",
+            }, screenshot_paths)
+            if await backend.submit(form):
+                submitted += 1
+
+    try:
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    finally:
+        await backend.stop()
+
+    return submitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--submissions', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--screenshots', type=int, default=3)
+    parser.add_argument('--screenshot-size', type=int, default=64 * 1024, help="bytes per screenshot")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInFormHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    table = Table(title=f"HTTP submissions ({args.submissions} submissions, "
+                        f"{args.screenshots} x {args.screenshot_size // 1024} KiB screenshots each)")
+    for column in ["Concurrency", "Submitted", "Seconds", "ms/submission", "Submissions/min"]:
+        table.add_column(column, justify="right")
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            screenshot_paths = make_screenshots(directory, args.screenshots, args.screenshot_size)
+
+            for concurrency in args.concurrency:
+                start = time.perf_counter()
+                submitted = asyncio.run(submit_all(base_url, args.submissions, concurrency, screenshot_paths))
+                elapsed = time.perf_counter() - start
+
+                table.add_row(str(concurrency), f"{submitted}/{args.submissions}", f"{elapsed:.2f}",
+                              f"{elapsed / args.submissions * 1000:.1f}", f"{args.submissions / elapsed * 60:,.0f}")
+    finally:
+        server.shutdown()
+
+    Console().print(table)
+
+
+if __name__ == '__main__':
+    main()
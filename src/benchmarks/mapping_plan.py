@@ -0,0 +1,137 @@
+"""
+Compares resolving an update mapping per entity against running the compiled mapping plan.
+
+Usage (from `src`): python -m benchmarks.mapping_plan [--entities 10000] [--rounds 5]
+"""
+import argparse
+import time
+from types import SimpleNamespace
+from typing import Any, Callable
+
+from rich.console import Console
+from rich.table import Table
+
+from utils.mapping import CompiledMapping, MappingPlan, compile_path
+from utils.validation import get_attr_by_path
+
+# same shape as the vehicle mapping in `main.py`
+MAPPING: dict[str, Any] = {
+    'uuid': None,
+    'scu': 'cargo_capacity',
+    'crew': ('crew', lambda crew: ','.join([str(m) for m in [crew.min, crew.max] if m is not None])),
+    'mass': 'mass',
+    'width': 'sizes.beam',
+    'height': 'sizes.height',
+    'length': 'sizes.length',
+    'fuel_quantum': 'quantum.quantum_fuel_capacity',
+    'fuel_hydrogen': 'fuel.capacity',
+}
+
+
+def make_entity(index: int) -> SimpleNamespace:
+    # attribute access only, shaped like a `WikiVehicle`
+    return SimpleNamespace(
+        uuid=f"00000000-0000-0000-0000-{index:012d}",
+        cargo_capacity=index % 96,
+        crew=SimpleNamespace(min=1, max=index % 4 + 1),
+        mass=1000.0 + index,
+        sizes=SimpleNamespace(beam=10.0, height=5.0, length=20.0 + index % 7),
+        quantum=SimpleNamespace(quantum_fuel_capacity=2.5),
+        fuel=None if index % 5 == 0 else SimpleNamespace(capacity=400.0),
+    )
+
+
+def compile_mapping(mapping: dict[str, Any]) -> MappingPlan:
+    plan: MappingPlan = []
+
+    for key, value in mapping.items():
+        mapper = None
+        if isinstance(value, tuple):
+            value, mapper = value
+
+        path = value or key
+        plan.append(CompiledMapping(target_property=key, source_path=path, accessor=compile_path(path), mapper=mapper))
+
+    return plan
+
+
+def run_per_entity(entities: list[SimpleNamespace]) -> int:
+    changes = 0
+
+    for entity in entities:
+        for target_property, source_mapping in MAPPING.items():
+            source_mapper: Callable | None = None
+            if isinstance(source_mapping, tuple):
+                source_mapping, source_mapper = source_mapping
+
+            if source_mapping is None:
+                source_mapping = target_property
+
+            source_value = get_attr_by_path(entity, source_mapping)
+            if source_value is None:
+                continue
+
+            if source_mapper is not None:
+                source_value = source_mapper(source_value)
+
+            changes += 1
+
+    return changes
+
+
+def run_plan(entities: list[SimpleNamespace], plan: MappingPlan) -> int:
+    changes = 0
+
+    for entity in entities:
+        for compiled in plan:
+            source_value = compiled.accessor(entity)
+            if source_value is None:
+                continue
+
+            if compiled.mapper is not None:
+                source_value = compiled.mapper(source_value)
+
+            changes += 1
+
+    return changes
+
+
+def measure(function: Callable[[], int], rounds: int) -> tuple[int, float]:
+    result = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function()
+
+    return result, (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entities', type=int, default=10_000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    entities = [make_entity(index) for index in range(args.entities)]
+    plan = compile_mapping(MAPPING)
+
+    per_entity_changes, per_entity_elapsed = measure(lambda: run_per_entity(entities), args.rounds)
+    plan_changes, plan_elapsed = measure(lambda: run_plan(entities, plan), args.rounds)
+    assert per_entity_changes == plan_changes
+
+    table = Table(title=f"Mapping ({args.entities} entities x {len(MAPPING)} fields, {args.rounds} rounds)")
+    for column in ["Strategy", "ms/run", "µs/entity", "Speedup"]:
+        table.add_column(column, justify="right")
+
+    for name, elapsed in [("per-entity", per_entity_elapsed), ("compiled plan", plan_elapsed)]:
+        table.add_row(
+            name,
+            f"{elapsed * 1000:.1f}",
+            f"{elapsed / args.entities * 1_000_000:.2f}",
+            f"{per_entity_elapsed / elapsed:.2f}x",
+        )
+
+    Console().print(table)
+
+
+if __name__ == '__main__':
+    main()
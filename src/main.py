@@ -1,4 +1,5 @@
-import numbers
+import asyncio
+from collections import Counter
 from typing import Type, TypeVar, Callable, TypeAlias, Any
 
 import structlog
@@ -9,13 +10,21 @@ from structlog.stdlib import get_logger
 from models.base.uex_base_model import UEXBaseModel
 from models.base.wiki_base_model import WikiBaseModel
 from models.uex.vehicle import UEXVehicle
-from models.update import Update, UpdateStatus, UpdateList
+from models.update import Update, UpdateStatus, UpdateList, UpdateFingerprint, UpdateFingerprintList, \
+    UpdateOutcome
 from models.wiki.vehicle import WikiVehicle
 from sync.uex import UEXSync
 from sync.wiki import WikiSync
-from updaters.uex import UEXUpdater
-from utils.cache import write_cache, read_cache
-from utils.validation import validate_value_path, get_attr_by_path
+from updaters.submission import SubmissionMethod
+from updaters.uex import UEXUpdater, remove_screenshots
+from utils.cache import write_cache, read_cache, prune
+from utils.diff import DiffMode, diff, validate_diff_mode
+from utils.fingerprint import get_fingerprint
+from utils.http import get_default_transport
+from utils.journal import Journal
+from utils.mapping import CompiledMapping, MappingPlan, compile_path
+from utils.matching import MatchStrategy, NameMatch, NameMatchIndex, JoinIndex, STRICT_STRATEGIES
+from utils.validation import validate_value_path
 
 structlog.configure(
     processors=[
@@ -32,13 +41,22 @@ structlog.configure(
 
 TTarget = TypeVar('TTarget', bound=UEXBaseModel)
 TSource = TypeVar('TSource', bound=WikiBaseModel)
+T = TypeVar('T', bound=UEXBaseModel | WikiBaseModel)
 UpdateMapping: TypeAlias = dict[str, str | tuple[str, Callable[[Any], Any]]]
 
+# number of journaled status changes after which the update list snapshot is rewritten
+UPDATE_JOURNAL_COMPACT_EVERY = 50
+
 
 class Main:
     def __init__(self, source_type: Type[TSource], target_type: Type[TTarget],
                  update_mapping: UpdateMapping, resource_type: UEXUpdater.ResourceType,
-                 dry_run: bool = False):
+                 dry_run: bool = False, incremental: bool = False,
+                 diff_mode: DiffMode = DiffMode.SCALAR, float_tolerance: float = 0.0,
+                 submission_pages: int = 1, max_submissions_per_minute: float | None = None,
+                 submission_lookahead: int = 0, combine_proofs: bool = False,
+                 proof_renderer: UEXUpdater.ProofRenderer = UEXUpdater.ProofRenderer.BROWSER,
+                 submission_method: SubmissionMethod = SubmissionMethod.BROWSER):
         self.log = get_logger()
         self.source_type = source_type
         self.target_type = target_type
@@ -46,20 +64,38 @@ class Main:
         self.mapping = update_mapping
         self.resource_type = resource_type
         self.dry_run = dry_run
-
-        self.validate_mapping()
-
-    def validate_mapping(self):
+        self.incremental = incremental
+        self.diff_mode = diff_mode
+        self.float_tolerance = float_tolerance
+        validate_diff_mode(diff_mode)
+        self.submission_pages = submission_pages
+        self.max_submissions_per_minute = max_submissions_per_minute
+        self.submission_lookahead = submission_lookahead
+        self.combine_proofs = combine_proofs
+        self.proof_renderer = proof_renderer
+        self.submission_method = submission_method
+
+        self.mapping_plan = self.validate_mapping()
+        self.mapping_signature = self.get_mapping_signature()
+        self.update_journal = Journal(self.get_update_list_name())
+
+    def validate_mapping(self) -> MappingPlan:
+        """
+        Validates the mapping and compiles it into a plan of prebuilt accessors and mappers,
+        so the mapping values and paths are not normalized and split again for every entity.
+        """
         self.log.info("Validating mapping...",
                       source_type=self.source_type.__name__,
                       target_type=self.target_type.__name__)
+        mapping_plan: MappingPlan = []
 
         for key, value in self.mapping.items():
             if not key in self.target_type.model_fields:
                 raise ValueError(f"Invalid mapping key: '{key}' is not present in '{TTarget.__name__}'")
 
+            mapper = None
             if isinstance(value, tuple) and len(value) == 2 and isinstance(value[1], Callable):
-                value = value[0]
+                value, mapper = value
 
             if value is None:
                 # Default for shorthand fields
@@ -72,128 +108,283 @@ class Main:
                                  f" '{value}' is neither a Callable nor a string")
 
             validate_value_path(key, value, self.source_type)
+            mapping_plan.append(CompiledMapping(
+                target_property=key,
+                source_path=value,
+                accessor=compile_path(value),
+                mapper=mapper,
+            ))
 
         self.log.info("> Mapping validated")
+        return mapping_plan
+
+    def get_mapping_signature(self) -> list[tuple[str, str, str | None]]:
+        """
+        Describes the mapping, including the code of mapper functions,
+        so any change to the mapping changes the fingerprints of all entities.
+        """
+        return [compiled.signature for compiled in self.mapping_plan]
+
+    def get_entity_fingerprint(self, uex_entry: TTarget, wiki_entry: TSource, source_values: list[Any]) -> str:
+        target_values = [getattr(uex_entry, compiled.target_property) for compiled in self.mapping_plan]
+
+        # the tolerance decides which changes are found, the diff mode only how
+        return get_fingerprint(self.mapping_signature, self.float_tolerance, wiki_entry.link,
+                               source_values, target_values)
+
+    def get_cached_fingerprints(self) -> UpdateFingerprintList:
+        fingerprints_raw = read_cache(f"{self.target_type.__name__}_fingerprints")
+        if fingerprints_raw is None:
+            return UpdateFingerprintList()
+
+        return UpdateFingerprintList.model_validate(fingerprints_raw)
+
+    def get_update_list_name(self) -> str:
+        return f"{self.target_type.__name__}_updates"
 
     def get_cached_update_list(self) -> UpdateList[TTarget]:
         self.log.info("Loading cached update list...")
-        update_list_raw = read_cache(f"{self.target_type.__name__}_updates")
+        update_list_raw = read_cache(self.get_update_list_name())
         if update_list_raw is not None:
             self.log.info("> Cache loaded")
-            update_list = UpdateList[TTarget].model_validate(update_list_raw)
+            # parsed with the concrete partial model, so the pending changes survive the round trip
+            update_list = UpdateList[self.target_type_partial].model_validate(update_list_raw)
         else:
             self.log.info("> Cache miss")
             update_list = UpdateList[TTarget]()
 
+        # status changes since the last snapshot, the records set absolute statuses, so replaying is idempotent
+        records = self.update_journal.replay()
+        for record in records:
+            if (update := update_list.updates.get(record['id'])) is not None:
+                update.status = UpdateStatus(record['status'])
+
+        if len(records) > 0:
+            self.log.info("> Journal replayed", records=len(records))
+
         return update_list
 
-    def sync_wiki(self) -> (list[TSource], dict[str, TSource]):
-        wiki_sync = WikiSync()
+    def write_update_list(self, update_list: UpdateList[TTarget], archive: bool = False):
+        """
+        Writes the update list snapshot and clears the journal, whose records are part of the snapshot now.
+        :param archive: Moves submitted updates to the archive first
+        """
+        if archive:
+            self.archive_submitted_updates(update_list)
+
+        write_cache(self.get_update_list_name(), update_list)
+        self.update_journal.truncate()
+
+    def archive_submitted_updates(self, update_list: UpdateList[TTarget]):
+        submitted = {
+            update_id: update
+            for update_id, update in update_list.updates.items()
+            if update.status == UpdateStatus.SUBMITTED
+        }
+        if len(submitted) == 0:
+            return
+
+        archive_name = f"{self.get_update_list_name()}_archive"
+        archive_raw = read_cache(archive_name)
+        archive = UpdateList[self.target_type_partial].model_validate(archive_raw) \
+            if archive_raw is not None \
+            else UpdateList[TTarget]()
+        archive.updates.update(submitted)
+
+        # the archive is written before the snapshot, so an interrupted run never loses an update
+        write_cache(archive_name, archive)
+
+        for update_id in submitted:
+            del update_list.updates[update_id]
+            update_list.archived_ids.add(update_id)
+            remove_screenshots(update_id)
+
+        self.log.info("> Submitted updates archived", archived=len(submitted))
+
+    def sync_wiki(self) -> (list[TSource], JoinIndex[TSource]):
+        wiki_sync = WikiSync(incremental=self.incremental)
         wiki_entries = wiki_sync.sync(self.source_type)
 
-        wiki_entry_dict = {
-            wiki_entry.name: wiki_entry
-            for wiki_entry in wiki_entries
-        }
+        wiki_entry_index = self.build_join_index(wiki_entries, fallback=NameMatchIndex(
+            wiki_entries, key=lambda wiki_entry: wiki_entry.name))
 
-        return wiki_entries, wiki_entry_dict
+        return wiki_entries, wiki_entry_index
 
-    def sync_uex(self) -> (list[TTarget], dict[str, TTarget]):
-        uex_sync = UEXSync()
+    def sync_uex(self) -> (list[TTarget], JoinIndex[TTarget]):
+        uex_sync = UEXSync(incremental=self.incremental)
         uex_entries = uex_sync.sync(self.target_type)
 
-        uex_entry_dict = {
-            uexItem.name: uexItem
-            for uexItem in uex_entries
-            if uexItem.name is not None
-        }
+        uex_entry_index = self.build_join_index(uex_entries)
+
+        return uex_entries, uex_entry_index
+
+    def build_join_index(self, entries: list[T], fallback: NameMatchIndex[T] | None = None) -> JoinIndex[T]:
+        join_index = JoinIndex(entries, fallback=fallback)
+
+        for strategy, keys in join_index.get_ambiguous_keys().items():
+            if len(keys) > 0:
+                self.log.warn("Ambiguous join keys, entities sharing them are joined by the next key",
+                              type=type(entries[0]).__name__, key=strategy, count=len(keys),
+                              keys=sorted(keys)[:20])
+
+        return join_index
+
+    def map_source_values(self, uex_entry: TTarget, source_values: list[Any]) -> list[Any]:
+        """
+        Applies the mapper functions of the mapping plan, a failing mapper skips its field.
+        """
+        mapped_values = []
 
-        return uex_entries, uex_entry_dict
+        for compiled, source_value in zip(self.mapping_plan, source_values):
+            if source_value is not None and compiled.mapper is not None:
+                try:
+                    source_value = compiled.mapper(source_value)
+                except Exception as e:
+                    self.log.warn("Error in mapping function", id=uex_entry.id, name=uex_entry.name,
+                                  target_property=compiled.target_property, error=e,
+                                  unexpected=True)
+                    source_value = None
+
+            mapped_values.append(source_value)
+
+        return mapped_values
 
     def prepare_updates(self,
-                        wiki_dict: dict[str, TSource],
+                        wiki_index: JoinIndex[TSource],
+                        uex_index: JoinIndex[TTarget],
                         uex_list: list[TTarget]
                         ) -> UpdateList[TTarget]:
         self.log.info("Preparing updates...")
         update_list = self.get_cached_update_list()
+        previous_fingerprints = self.get_cached_fingerprints()
+        fingerprints = UpdateFingerprintList()
 
         count_no_source_match = 0
+        count_join_conflicts = 0
+        # ids of the entities whose match carries the UUID of another entity
+        uuid_conflicting: set[int] = set()
+
+        def is_uuid_unclaimed(uex_entry: TTarget, match: NameMatch[TSource]) -> bool:
+            # entities without a UUID would otherwise be updated with the UUID of another entity
+            owners = uex_index.get(MatchStrategy.UUID, match.entry.uuid) if match.entry.uuid else []
+            other_owners = [owner for owner in owners if owner.id != uex_entry.id]
+            if len(other_owners) == 0:
+                return True
+
+            self.log.warn("Entity skipped, wiki entry UUID belongs to another entity", name=uex_entry.name,
+                          wiki_name=match.entry.name, strategy=match.strategy, uuid=match.entry.uuid,
+                          owner_ids=[owner.id for owner in other_owners])
+            uuid_conflicting.add(uex_entry.id)
+            return False
         count_updates_created = 0
-
-        for uex_entry in uex_list:
-            if uex_entry.id in update_list.updates and update_list.updates[uex_entry.id].status != UpdateStatus.PENDING:
+        count_fingerprint_match = 0
+        count_match_strategies: Counter[MatchStrategy] = Counter()
+
+        # entities that have to be diffed, with their mapped source and current target values
+        candidates: list[tuple[TTarget, NameMatch[TSource], str]] = []
+        source_rows: list[list[Any]] = []
+        target_rows: list[list[Any]] = []
+
+        # also joins the skipped entities, they keep their entries from being joined with other entities
+        matches, conflicts = wiki_index.match_all(uex_list, is_allowed=is_uuid_unclaimed)
+        for conflict in conflicts:
+            claimed_by = uex_list[conflict.claimed_by] if conflict.claimed_by is not None else None
+            self.log.warn("Entity skipped, wiki entry is joined with several entities",
+                          name=uex_list[conflict.index].name, wiki_name=conflict.match.entry.name,
+                          strategy=conflict.match.strategy,
+                          claimed_by=claimed_by.name if claimed_by is not None else None)
+        conflicting = {conflict.index for conflict in conflicts}
+
+        for index, (uex_entry, match) in enumerate(zip(uex_list, matches)):
+            if uex_entry.id in update_list.archived_ids or (
+                    uex_entry.id in update_list.updates
+                    and update_list.updates[uex_entry.id].status != UpdateStatus.PENDING):
                 self.log.warn("Entity skipped, has processed update", name=uex_entry.name)
                 continue
 
-            if uex_entry.name not in wiki_dict:
+            if index in conflicting or uex_entry.id in uuid_conflicting:
+                count_join_conflicts += 1
+                continue
+
+            if match is None:
                 self.log.warn("Entity skipped, no matching wiki entry", name=uex_entry.name)
                 count_no_source_match += 1
                 continue
 
-            wiki_entry = wiki_dict[uex_entry.name]
+            wiki_entry = match.entry
+            count_match_strategies[match.strategy] += 1
+            if match.strategy not in STRICT_STRATEGIES:
+                self.log.info("> Matched wiki entry", name=uex_entry.name, wiki_name=wiki_entry.name,
+                              strategy=match.strategy, confidence=match.confidence)
+
+            source_values = [compiled.accessor(wiki_entry) for compiled in self.mapping_plan]
+
+            # neither side nor the mapping changed since the last run, so the previous outcome still applies
+            fingerprint = self.get_entity_fingerprint(uex_entry, wiki_entry, source_values)
+            previous = previous_fingerprints.fingerprints.get(uex_entry.id)
+            if previous is not None and previous.fingerprint == fingerprint and (
+                    previous.outcome == UpdateOutcome.UNCHANGED or uex_entry.id in update_list.updates):
+                fingerprints.fingerprints[uex_entry.id] = previous
+                count_fingerprint_match += 1
+                continue
+
+            candidates.append((uex_entry, match, fingerprint))
+            source_rows.append(self.map_source_values(uex_entry, source_values))
+            target_rows.append([getattr(uex_entry, compiled.target_property) for compiled in self.mapping_plan])
+
+        changes = diff(source_rows, target_rows, self.diff_mode, self.float_tolerance)
+
+        for (uex_entry, match, fingerprint), source_row, changed in zip(candidates, source_rows, changes):
             changed_fields: list[str] = []
             update = Update(
                 id=uex_entry.id,
                 name=uex_entry.name,
-                source_link=wiki_entry.link,
+                source_link=match.entry.link,
+                match_strategy=match.strategy,
                 status=UpdateStatus.PENDING,
                 changes=self.target_type_partial()
             )
 
-            for target_property, source_mapping in self.mapping.items():
-                source_mapper = None
-                if isinstance(source_mapping, tuple):
-                    source_mapping, source_mapper = source_mapping
-
-                if source_mapping is None:
-                    source_mapping = target_property
-
-                source_value = get_attr_by_path(wiki_entry, source_mapping)
-                if source_value is None:
-                    continue
-
-                if source_mapper is not None:
-                    try:
-                        source_value = source_mapper(source_value)
-                    except Exception as e:
-                        self.log.warn("Error in mapping function", id=uex_entry.id, name=uex_entry.name,
-                                      target_property=target_property, error=e,
-                                      unexpected=True)
-                        continue
-
-                if isinstance(source_value, numbers.Number) and source_value == 0:
-                    continue
-
-                if getattr(uex_entry, target_property) == source_value:
+            for compiled, source_value, is_changed in zip(self.mapping_plan, source_row, changed):
+                if not is_changed:
                     continue
 
-                setattr(update.changes, target_property, source_value)
-                update.change_source_mapping[target_property] = source_mapping
+                setattr(update.changes, compiled.target_property, source_value)
+                update.change_source_mapping[compiled.target_property] = compiled.source_path
 
-                changed_fields.append(target_property)
+                changed_fields.append(compiled.target_property)
 
             if len(changed_fields) == 0:
                 self.log.warn("Entity skipped, no changes found", name=uex_entry.name)
+                fingerprints.fingerprints[uex_entry.id] = UpdateFingerprint(
+                    fingerprint=fingerprint, outcome=UpdateOutcome.UNCHANGED)
                 continue
 
+            fingerprints.fingerprints[uex_entry.id] = UpdateFingerprint(
+                fingerprint=fingerprint, outcome=UpdateOutcome.PENDING)
             update_list.updates[uex_entry.id] = update
             count_updates_created += 1
 
             self.log.info("> Updated prepared", id=uex_entry.id, name=uex_entry.name,
                           changed_fields=changed_fields)
 
-        write_cache(f"{self.target_type.__name__}_updates", update_list)
+        self.write_update_list(update_list)
+        write_cache(f"{self.target_type.__name__}_fingerprints", fingerprints)
         self.log.info("Updates prepared", no_source_match=count_no_source_match,
-                      updates_created=count_updates_created)
+                      join_conflicts=count_join_conflicts, updates_created=count_updates_created,
+                      fingerprint_match=count_fingerprint_match,
+                      match_strategies={strategy.value: count for strategy, count in count_match_strategies.items()})
 
         return update_list
 
     def run(self):
         self.log.info("Starting UEX Database Updater...")
-        wiki_list, wiki_dict = self.sync_wiki()
-        uex_list, uex_dict = self.sync_uex()
+        wiki_list, wiki_index = self.sync_wiki()
+        uex_list, uex_index = self.sync_uex()
+        self.log.info("Synchronization finished", **get_default_transport().stats.as_dict())
+        prune()
 
-        update_list = self.prepare_updates(wiki_dict, uex_list)
+        update_list = self.prepare_updates(wiki_index, uex_index, uex_list)
         self.log.info("")
 
         self.log.info("")
@@ -209,9 +400,15 @@ class Main:
         self.log.info("Finished UEX DatabaseUpdater")
 
     def update(self, resource_type: UEXUpdater.ResourceType, update_list: UpdateList[TTarget]):
-        sorted_updates = sorted(update_list.updates.values(), key=lambda u: u.id)
+        asyncio.run(self.update_async(resource_type, update_list))
 
-        with UEXUpdater() as uexUpdater, Progress() as progress:
+    async def update_async(self, resource_type: UEXUpdater.ResourceType, update_list: UpdateList[TTarget]):
+        sorted_updates = sorted([
+            update for update in update_list.updates.values()
+            if update.status == UpdateStatus.PENDING
+        ], key=lambda u: u.id)
+
+        with Progress() as progress:
             progress.columns = [
                 TextColumn("[progress.description]{task.description}"),
                 BarColumn(),
@@ -222,23 +419,31 @@ class Main:
 
             task = progress.add_task(f"Updating {resource_type.value}", total=len(sorted_updates))
 
-            for update in sorted_updates:  # track(sorted_updates, description=f"Updating {resource_type.value}", ):
+            # runs on the event loop, so status changes are recorded one at a time even with several pages
+            def on_complete(update: Update, submitted: bool):
                 progress.update(task, advance=1)
 
-                try:
-                    if uexUpdater.update(resource_type, update, dry_run=self.dry_run):
-                        update.status = UpdateStatus.SUBMITTED
-                    else:
-                        update.status = UpdateStatus.FAILED
-                except Exception as e:
-                    self.log.error("Failed to update", id=update.id, name=update.name, error=e, unexpected=True)
-                    update.status = UpdateStatus.FAILED
-
+                update.status = UpdateStatus.SUBMITTED if submitted else UpdateStatus.FAILED
                 update_list.updates[update.id] = update
                 if self.dry_run:
-                    continue
-
-                write_cache(f"{self.target_type.__name__}_updates", update_list)
+                    return
+
+                # only the status change is appended, the snapshot is rewritten periodically
+                self.update_journal.append({'id': update.id, 'status': update.status})
+                if self.update_journal.length >= UPDATE_JOURNAL_COMPACT_EVERY:
+                    self.write_update_list(update_list, archive=True)
+
+            async with UEXUpdater(pages=self.submission_pages,
+                                  max_submissions_per_minute=self.max_submissions_per_minute,
+                                  lookahead=self.submission_lookahead,
+                                  combine_proofs=self.combine_proofs,
+                                  proof_renderer=self.proof_renderer,
+                                  submission_method=self.submission_method) as uexUpdater:
+                await uexUpdater.update_all(resource_type, sorted_updates, dry_run=self.dry_run,
+                                            on_complete=on_complete)
+
+        if not self.dry_run:
+            self.write_update_list(update_list, archive=True)
 
 
 if __name__ == '__main__':
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from datetime import timedelta
 from typing import ClassVar, Callable, Optional, Type
 
 from models.base.custom_base_model import CustomBaseModel
@@ -6,6 +7,8 @@ from models.base.custom_base_model import CustomBaseModel
 
 class UEXBaseModel(CustomBaseModel, ABC):
     BASE_URL: ClassVar[str] = 'https://api.uexcorp.space/2.0'
+    # how long cached responses are used before they are fetched again, `None` to never expire
+    CACHE_TTL: ClassVar[Optional[timedelta]] = timedelta(hours=12)
 
     FOREACH: ClassVar[Optional[Type['UEXBaseModel']]] = None
     FOREACH_MAP: ClassVar[Optional[Callable[['UEXBaseModel'], str]]] = None
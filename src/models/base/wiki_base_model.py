@@ -1,4 +1,5 @@
 from abc import ABC
+from datetime import timedelta
 from functools import wraps
 from typing import ClassVar, Optional, Type, Callable
 
@@ -7,6 +8,8 @@ from models.base.custom_base_model import CustomBaseModel
 
 class WikiBaseModel(CustomBaseModel, ABC):
     BASE_URL: ClassVar[str] = 'https://api.star-citizen.wiki/api'
+    # how long cached responses are used before they are fetched again, `None` to never expire
+    CACHE_TTL: ClassVar[Optional[timedelta]] = timedelta(days=1)
     IS_PAGINATED: ClassVar[bool] = False
     PAGINATION_MODEL: ClassVar[Optional[Type['WikiPaginatedModel']]] = None
 
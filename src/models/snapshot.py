@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+
+class WikiSnapshotEntry(BaseModel):
+    updated_at: str
+    version: str | None = None
+    record: dict[str, Any]
+
+
+class WikiSnapshot(BaseModel):
+    # latest `updated_at` of all entries
+    watermark: str | None = None
+    # pagination link -> entry
+    entries: dict[str, WikiSnapshotEntry] = Field(default_factory=dict)
+
+
+class UEXSnapshotParent(BaseModel):
+    # `date_modified` of the `FOREACH` parent the entries were fetched for
+    date_modified: datetime | None = None
+    entries: list[dict[str, Any]] = Field(default_factory=list)
+
+
+class UEXSnapshot(BaseModel):
+    # latest `date_modified` of all entries
+    watermark: datetime | None = None
+    # parent id -> entries
+    parents: dict[str, UEXSnapshotParent] = Field(default_factory=dict)
@@ -16,10 +16,30 @@ class Update(BaseModel, Generic[T]):
     id: int
     name: str
     source_link: str
+    # how the source entry was matched by name, see `utils.matching.MatchStrategy`
+    match_strategy: str | None = None
     status: UpdateStatus
     # uex property name -> wiki property name
     change_source_mapping: dict[str, str] = Field(default_factory=dict)
     changes: T
 
 class UpdateList(BaseModel, Generic[T]):
-    updates: dict[int, Update[T]] = Field(default_factory=dict)
\ No newline at end of file
+    updates: dict[int, Update[T]] = Field(default_factory=dict)
+    # ids of submitted updates that were moved to the archive
+    archived_ids: set[int] = Field(default_factory=set)
+
+class UpdateOutcome(StrEnum):
+    # the entity matched its source, no update was created
+    UNCHANGED = "unchanged"
+    # a pending update was created for the entity
+    PENDING = "pending"
+
+
+class UpdateFingerprint(BaseModel):
+    fingerprint: str
+    outcome: UpdateOutcome
+
+
+class UpdateFingerprintList(BaseModel):
+    # entity id -> fingerprint of the entity, its source entry and the mapping
+    fingerprints: dict[int, UpdateFingerprint] = Field(default_factory=dict)
@@ -1,18 +1,41 @@
+import asyncio
 import os
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from typing import Callable
+from urllib.parse import urlparse
 
 import requests
 from requests import Response
 from structlog.stdlib import get_logger
 
-from utils.cache import write_cache, read_cache
+from utils.cache import write_cache, read_cache, read_cache_meta, write_cache_meta, write_negative_cache, \
+    is_expired, is_negative_cached
+from utils.codec import loads
+from utils.http import Transport, get_default_transport
+
+FetchCallback = Callable[[int, str, dict | None, float], None]
 
 
 class BaseSync(ABC):
 
-    def __init__(self, use_cache: bool = True):
+    def __init__(self, use_cache: bool = True, revalidate: bool = False,
+                 max_concurrency: int = 16, max_concurrency_per_host: int = 8,
+                 transport: Transport | None = None):
+        """
+        :param use_cache: Reads and writes responses from and to the cache
+        :param revalidate: Revalidates cached responses with a conditional request instead of using them as-is,
+                           a `304 Not Modified` response counts as a cache hit
+        """
         self.log = get_logger()
         self.use_cache = use_cache
+        self.revalidate = revalidate
+        self.transport = transport or get_default_transport()
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_host = max_concurrency_per_host
 
     @abstractmethod
     def sync(self, modelType: type):
@@ -24,35 +47,142 @@ class BaseSync(ABC):
     def validate_parsed(self, parsed: dict) -> bool:
         return True
 
-    def fetch(self, url: str, *, prefix: str | None = None) -> dict | None:
+    @staticmethod
+    def get_conditional_headers(meta: dict | None) -> dict[str, str]:
+        headers: dict[str, str] = {}
+        if meta is None:
+            return headers
+
+        if meta.get('etag') is not None:
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified') is not None:
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        return headers
+
+    def fetch(self, url: str, *, prefix: str | None = None, ttl: timedelta | None = None,
+              refresh: bool = False) -> dict | None:
+        """
+        :param ttl: How long a cached response is used before it is fetched again, `None` to use it forever
+        :param refresh: Fetches the URL again even if the cached response is still fresh,
+                        a conditional request is used if possible
+        """
         prefix = os.path.join(self.__class__.__name__, *[
             p for p in [prefix]
             if p is not None
         ])
+        cached = None
+        headers: dict[str, str] = {}
 
         if self.use_cache:
+            meta = read_cache_meta(url, prefix=prefix)
+
+            if is_negative_cached(meta) and not refresh:
+                self.log.debug("Skipped fetching, negative cache hit", url=url, status_code=meta['status_code'])
+                return None
+
             cached = read_cache(url, prefix=prefix)
 
             if cached is not None:
-                return cached
+                if not self.revalidate and not refresh and not is_expired(meta, ttl):
+                    return cached
+
+                headers = self.get_conditional_headers(meta)
 
         try:
-            response = requests.get(url)
+            response = self.transport.get(url, headers=headers)
         except requests.exceptions.RequestException as e:
             self.log.error(f"Fetching failed", url=url, error=e)
             return None
 
+        # only sent conditional requests can be answered with `304 Not Modified`
+        if response.status_code == 304 and headers:
+            write_cache_meta(url, {
+                **meta,
+                **self.get_cache_timestamps(ttl),
+            }, prefix=prefix)
+            return cached
+
         if not self.validate_response(response):
             self.log.error(f"Fetching failed", url=url, status_code=response.status_code)
+
+            if self.use_cache and response.status_code == 404:
+                write_negative_cache(url, response.status_code, prefix=prefix)
+
             return None
 
-        parsed = response.json()
+        # the raw body is parsed once and cached unchanged, instead of being re-serialized for the cache
+        contents = response.content
+        try:
+            parsed = loads(contents)
+        except ValueError as e:
+            self.log.error(f"Invalid response", url=url, error=e)
+            return None
 
         if not self.validate_parsed(parsed):
             self.log.error(f"Invalid response", url=url, parsed=parsed)
             return None
 
         if self.use_cache:
-            write_cache(url, parsed, prefix=prefix)
+            write_cache(url, contents, prefix=prefix, decoded=parsed, meta={
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                **self.get_cache_timestamps(ttl),
+            })
 
         return parsed
+
+    @staticmethod
+    def get_cache_timestamps(ttl: timedelta | None) -> dict[str, float | None]:
+        fetched_at = time.time()
+        return {
+            'fetched_at': fetched_at,
+            'expires_at': None if ttl is None else fetched_at + ttl.total_seconds(),
+        }
+
+    async def fetch_many(self, urls: list[str], *, prefix: str | None = None, ttl: timedelta | None = None,
+                         refresh: bool = False, on_complete: FetchCallback | None = None,
+                         max_concurrency: int | None = None,
+                         max_concurrency_per_host: int | None = None) -> list[dict | None]:
+        """
+        Fetches all URLs concurrently, bounded by `max_concurrency` in total
+        and by `max_concurrency_per_host` for each host.
+        Every URL goes through `fetch`, so caching and validation behave exactly as for single fetches.
+        :param urls: The URLs to fetch
+        :param prefix: The cache prefix, see `fetch`
+        :param ttl: The cache TTL, see `fetch`
+        :param refresh: Ignores fresh cached responses, see `fetch`
+        :param on_complete: Called with the index, URL, result and duration in seconds of every fetch
+                            as soon as it completes
+        :param max_concurrency: Overrides `max_concurrency` for this call
+        :param max_concurrency_per_host: Overrides `max_concurrency_per_host` for this call,
+                                         a call fetching from a single host is bound by the lower of both limits
+        :return: The results in the same order as `urls`, `None` for failed fetches
+        """
+        max_concurrency = max_concurrency or self.max_concurrency
+        global_limit = asyncio.Semaphore(max_concurrency)
+        max_concurrency_per_host = max_concurrency_per_host or self.max_concurrency_per_host
+        host_limits: dict[str, asyncio.Semaphore] = {}
+        loop = asyncio.get_running_loop()
+
+        async def fetch_one(index: int, url: str) -> dict | None:
+            host = urlparse(url).netloc
+            host_limit = host_limits.setdefault(host, asyncio.Semaphore(max_concurrency_per_host))
+
+            async with global_limit, host_limit:
+                start = time.perf_counter()
+                result = await loop.run_in_executor(
+                    executor, partial(self.fetch, url, prefix=prefix, ttl=ttl, refresh=refresh))
+                elapsed = time.perf_counter() - start
+
+            if on_complete is not None:
+                on_complete(index, url, result, elapsed)
+
+            return result
+
+        # the default executor of the loop has fewer threads than the limits may allow
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(await asyncio.gather(*[
+                fetch_one(index, url)
+                for index, url in enumerate(urls)
+            ]))
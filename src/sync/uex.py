@@ -1,45 +1,165 @@
+import asyncio
 from typing import TypeVar, Type
 
 from typing_extensions import override
 
 from models.base.uex_base_model import UEXBaseModel
+from models.snapshot import UEXSnapshot, UEXSnapshotParent
 from models.uex.item import UEXItem
 from sync.base import BaseSync
+from utils.cache import read_cache, write_cache
+from utils.http import Transport
 
 T = TypeVar('T', bound=UEXBaseModel)
 
 
 class UEXSync(BaseSync):
+    def __init__(self, use_cache: bool = True, foreach_concurrency: int = 8, incremental: bool = False,
+                 revalidate: bool = False, max_concurrency: int = 16, max_concurrency_per_host: int = 8,
+                 transport: Transport | None = None):
+        """
+        :param foreach_concurrency: Number of `FOREACH` expansions fetched at once,
+                                    overrides both concurrency limits for them
+        :param incremental: Only fetches the `FOREACH` expansions whose parent `date_modified` changed
+                            since the last run and reuses the previous entries for all others.
+                            All other responses are always refreshed in this mode.
+        """
+        super().__init__(use_cache, revalidate, max_concurrency, max_concurrency_per_host, transport)
+        self.foreach_concurrency = foreach_concurrency
+        self.incremental = incremental
 
     def sync(self, modelType: Type[T]) -> list[T]:
         fetch_url = f"{modelType.BASE_URL}{modelType.ENDPOINT_PATH}"
         self.log.info("Synchronizing UEX", model=modelType.__name__, source=fetch_url)
 
-        if modelType.FOREACH is not None:
-            fetch_urls = [
-                fetch_url + modelType.FOREACH_MAP(model)
-                for model in self.sync(modelType.FOREACH)
-            ]
-        else:
-            fetch_urls = [fetch_url]
+        if modelType.FOREACH is None:
+            return self.sync_urls(modelType, [fetch_url])
+
+        # sorted, so the merged results do not depend on the order of the parent response
+        parents = sorted(self.sync(modelType.FOREACH), key=lambda parent: parent.id)
+
+        if self.incremental:
+            return self.sync_foreach_incremental(modelType, fetch_url, parents)
+
+        return self.sync_urls(modelType, [
+            fetch_url + modelType.FOREACH_MAP(parent)
+            for parent in parents
+        ], max_concurrency=self.foreach_concurrency)
+
+    def sync_urls(self, modelType: Type[T], fetch_urls: list[str], max_concurrency: int | None = None) -> list[T]:
+        # `fetch_entries` keeps the order of `fetch_urls`, which makes the merge deterministic
+        return [
+            entry
+            for entries in self.fetch_entries(modelType, fetch_urls, max_concurrency)
+            if entries is not None
+            for entry in entries
+        ]
+
+    def fetch_entries(self, modelType: Type[T], fetch_urls: list[str],
+                      max_concurrency: int | None = None) -> list[list[T] | None]:
+        """
+        :return: The entries of every URL in the order of `fetch_urls`, `None` if fetching failed
+        """
+        timings: dict[str, float] = {}
+        failures: list[str] = []
+
+        def on_complete(index: int, url: str, result: dict | None, elapsed: float):
+            timings[url] = elapsed
+            if result is None or result['data'] is None:
+                failures.append(url)
 
-        results: list[T] = []
+            self.log.debug("> Fetched", model=modelType.__name__, url=url, elapsed=f"{elapsed:.3f}s",
+                           failed=url in failures)
 
-        for url in fetch_urls:
-            result = self.fetch(url, prefix=modelType.__name__)
+        responses = asyncio.run(self.fetch_many(fetch_urls, prefix=modelType.__name__, ttl=modelType.CACHE_TTL,
+                                                refresh=self.incremental, on_complete=on_complete,
+                                                # all URLs are on the UEX API host, so both limits are raised
+                                                max_concurrency=max_concurrency,
+                                                max_concurrency_per_host=max_concurrency))
 
-            if result is None or result['data'] is None:
-                continue
-
-            entries = [
+        results: list[list[T] | None] = [
+            None if result is None or result['data'] is None else [
                 modelType(**entry)
                 for entry in result['data']
             ]
+            for result in responses
+        ]
+
+        if len(fetch_urls) > 1:
+            slowest = max(timings, key=timings.get)
+            self.log.info("> Synchronized", model=modelType.__name__, urls=len(fetch_urls),
+                          entries=sum(len(entries) for entries in results if entries is not None),
+                          failed=len(failures), slowest=slowest, slowest_elapsed=f"{timings[slowest]:.3f}s")
+
+        for url in failures:
+            self.log.warn("> Failed to synchronize", model=modelType.__name__, url=url)
 
-            results.extend(entries)
+        return results
+
+    def sync_foreach_incremental(self, modelType: Type[T], fetch_url: str, parents: list[UEXBaseModel]) -> list[T]:
+        snapshot = self.get_cached_snapshot(modelType)
+        updated_snapshot = UEXSnapshot()
+        changed_parents: list[UEXBaseModel] = []
+
+        for parent in parents:
+            parent_id = str(parent.id)
+            date_modified = getattr(parent, 'date_modified', None)
+            previous = snapshot.parents.get(parent_id)
+
+            if previous is not None and date_modified is not None and previous.date_modified == date_modified:
+                updated_snapshot.parents[parent_id] = previous
+            else:
+                changed_parents.append(parent)
+
+        self.log.info("> Snapshot compared", model=modelType.__name__,
+                      unchanged=len(parents) - len(changed_parents), changed=len(changed_parents),
+                      watermark=snapshot.watermark)
+
+        fetched = self.fetch_entries(modelType, [
+            fetch_url + modelType.FOREACH_MAP(parent)
+            for parent in changed_parents
+        ], max_concurrency=self.foreach_concurrency)
+
+        for parent, entries in zip(changed_parents, fetched):
+            parent_id = str(parent.id)
+
+            if entries is None:
+                # the previous entries are kept, without the new `date_modified`, so they are fetched again next run
+                if parent_id in snapshot.parents:
+                    updated_snapshot.parents[parent_id] = snapshot.parents[parent_id]
+                continue
+
+            updated_snapshot.parents[parent_id] = UEXSnapshotParent(
+                date_modified=getattr(parent, 'date_modified', None),
+                entries=[entry.model_dump(mode='json') for entry in entries],
+            )
+
+        results: list[T] = [
+            modelType(**entry)
+            for parent in parents
+            if (snapshot_parent := updated_snapshot.parents.get(str(parent.id))) is not None
+            for entry in snapshot_parent.entries
+        ]
+
+        # latest `date_modified` of all entries
+        updated_snapshot.watermark = max([
+            entry.date_modified for entry in results
+            if getattr(entry, 'date_modified', None) is not None
+        ], default=None)
+        write_cache(self.get_snapshot_name(modelType), updated_snapshot, prefix=self.__class__.__name__)
 
         return results
 
+    def get_snapshot_name(self, modelType: Type[T]) -> str:
+        return f"{modelType.__name__}_snapshot"
+
+    def get_cached_snapshot(self, modelType: Type[T]) -> UEXSnapshot:
+        snapshot_raw = read_cache(self.get_snapshot_name(modelType), prefix=self.__class__.__name__)
+        if snapshot_raw is None:
+            return UEXSnapshot()
+
+        return UEXSnapshot.model_validate(snapshot_raw)
+
     @override
     def validate_parsed(self, parsed: dict) -> bool:
         return super().validate_parsed(parsed) and parsed["status"] == "ok"
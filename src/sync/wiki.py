@@ -1,21 +1,35 @@
-from typing import TypeVar, Type
+import asyncio
+from typing import TypeVar, Type, Callable
 
-from rich.progress import Progress, track
+from rich.progress import Progress
 
 from models.base.wiki_base_model import WikiBaseModel, WikiPaginatedModel
 from models.responses.wiki_paginated import PaginatedResponse
+from models.snapshot import WikiSnapshot, WikiSnapshotEntry
 from models.wiki.item import WikiItem
 from sync.base import BaseSync
-from utils.cache import read_cache
+from utils.cache import read_cache, write_cache
+from utils.http import Transport
 from utils.model import try_parse, try_parse_all
 
 T = TypeVar('T', bound=WikiBaseModel)
 
 
 class WikiSync(BaseSync):
-    def __init__(self, use_cache: bool = True, pagination_limit: int = 500):
-        super().__init__(use_cache)
+    def __init__(self, use_cache: bool = True, pagination_limit: int = 500, detail_workers: int = 8,
+                 incremental: bool = False,
+                 revalidate: bool = False, max_concurrency: int = 16, max_concurrency_per_host: int = 8,
+                 transport: Transport | None = None):
+        """
+        :param detail_workers: Number of details fetched at once, overrides both concurrency limits for them
+        :param incremental: Only fetches the details of entries whose `updated_at` or `version` changed
+                            since the last run and reuses the previous records for all others.
+                            The pages are always refreshed in this mode.
+        """
+        super().__init__(use_cache, revalidate, max_concurrency, max_concurrency_per_host, transport)
         self.pagination_limit = pagination_limit
+        self.detail_workers = detail_workers
+        self.incremental = incremental
 
     def sync(self, modelType: Type[T]) -> list[T]:
         fetch_url = f"{modelType.BASE_URL}{modelType.ENDPOINT_PATH}"
@@ -37,56 +51,160 @@ class WikiSync(BaseSync):
 
         return []
 
+    def get_page_url(self, fetch_url: str, page: int) -> str:
+        page_url = f"{fetch_url}?limit={self.pagination_limit}"
+        if page > 1:
+            page_url += f"&page={page}"
+        return page_url
+
     def sync_paginated(self, modelType: Type[T], fetch_url: str = None) -> list[T]:
         self.log.info("Synchronizing paginated Wiki model", model=modelType.__name__, source=fetch_url)
-        next_url = f"{fetch_url}?limit={self.pagination_limit}"
-        is_first_iteration = True
-        results: list[T] = []
 
         with Progress() as progress:
             task = progress.add_task(f"Syncing {modelType.__name__}", total=None)
 
-            while next_url:
-                response = self.fetch(next_url, prefix=modelType.__name__)
-
-                parsed = PaginatedResponse(**response)
-                next_url = parsed.links.next
-
-                results.extend(
-                    try_parse_all(modelType, parsed.data, self.log)
-                )
-
-                if is_first_iteration:
-                    is_first_iteration = False
-                    progress.columns[2].text_format = '[progress.percentage][{task.completed}/{task.total}]'
+            response = self.fetch(self.get_page_url(fetch_url, 1), prefix=modelType.__name__,
+                                  ttl=modelType.CACHE_TTL, refresh=self.incremental)
+            if response is None:
+                self.log.error("Failed to fetch first page", model=modelType.__name__, source=fetch_url)
+                return []
+
+            first_page = PaginatedResponse(**response)
+            last_page = first_page.meta.last_page
+
+            progress.columns[2].text_format = '[progress.percentage][{task.completed}/{task.total}]'
+            progress.update(task, total=last_page, completed=1)
+
+            # every page URL is known once we have the first page,
+            # so the remaining pages can be fetched concurrently
+            page_urls = [self.get_page_url(fetch_url, page) for page in range(2, last_page + 1)]
+            responses = asyncio.run(self.fetch_many(
+                page_urls,
+                prefix=modelType.__name__,
+                ttl=modelType.CACHE_TTL,
+                refresh=self.incremental,
+                on_complete=lambda *_: progress.advance(task)
+            ))
+
+        results: list[T] = try_parse_all(modelType, first_page.data, self.log)
+
+        # `fetch_many` keeps the order of `page_urls`, so the results stay in page order
+        for page_url, response in zip(page_urls, responses):
+            if response is None:
+                self.log.error("Failed to fetch page", model=modelType.__name__, source=page_url)
+                continue
 
-                progress.update(task, total=parsed.meta.last_page, completed=parsed.meta.current_page)
+            results.extend(
+                try_parse_all(modelType, PaginatedResponse(**response).data, self.log)
+            )
 
         return results
 
-    def sync_details(self,
-                     modelType: Type[T], pagination_results: list[WikiPaginatedModel]) -> list[T]:
-        self.log.info("Synchronizing Wiki model details", model=modelType.__name__)
-        results: list[T] = []
-
-        for result in track(pagination_results, description=f"Syncing {modelType.__name__} details"):
-            response = self.fetch(result.link, prefix=modelType.__name__)
-
+    def fetch_details(self,
+                      modelType: Type[T], pagination_results: list[WikiPaginatedModel],
+                      on_parsed: Callable[[int, T | None], None], refresh: bool = False):
+        """
+        Fetches the details of all pagination results through `fetch_many`, at most `detail_workers` at once,
+        and parses each record as soon as it completes.
+        :param on_parsed: Called with the index in `pagination_results` and the parsed record,
+                          or `None` if fetching or parsing failed
+        """
+        partial_model_type = modelType.model_as_partial()
+
+        def on_complete(index: int, url: str, response: dict | None, elapsed: float):
             if response is None or not "data" in response:
-                continue
+                on_parsed(index, None)
+                return
 
             # copy fields from paginated model, e.g. UUID
             # for vehicles, UUID is not available on the details page
             # in some cases, and the details page has very different fields.
             # By specifying the paginated model fields first, we can override them
             # with the details page results, if they are present
-            parsed = try_parse(modelType.model_as_partial(), {**result.__dict__, **response['data']}, self.log)
-            if parsed is None: # error handled and logged in `try_parse`
-                continue
-            results.append(parsed)
+            # errors are handled and logged in `try_parse`
+            on_parsed(index, try_parse(partial_model_type,
+                                       {**pagination_results[index].__dict__, **response['data']}, self.log))
+
+        asyncio.run(self.fetch_many(
+            [result.link for result in pagination_results],
+            prefix=modelType.__name__,
+            ttl=modelType.CACHE_TTL,
+            refresh=refresh,
+            on_complete=on_complete,
+            # all details are fetched from the Wiki API host, so both limits are raised
+            max_concurrency=self.detail_workers,
+            max_concurrency_per_host=self.detail_workers,
+        ))
 
-        return results
+    def sync_details(self,
+                     modelType: Type[T], pagination_results: list[WikiPaginatedModel]) -> list[T]:
+        self.log.info("Synchronizing Wiki model details", model=modelType.__name__, workers=self.detail_workers,
+                      incremental=self.incremental)
+        results: list[T | None] = [None] * len(pagination_results)
+
+        snapshot = self.get_cached_snapshot(modelType) if self.incremental else WikiSnapshot()
+        partial_model_type = modelType.model_as_partial()
+        changed_indices: list[int] = []
+
+        for index, result in enumerate(pagination_results):
+            entry = snapshot.entries.get(result.link)
 
+            if entry is not None and entry.updated_at == result.updated_at and entry.version == result.version:
+                results[index] = try_parse(partial_model_type, entry.record, self.log)
+
+            if results[index] is None:
+                changed_indices.append(index)
+
+        if self.incremental:
+            self.log.info("> Snapshot compared", model=modelType.__name__,
+                          unchanged=len(pagination_results) - len(changed_indices), changed=len(changed_indices),
+                          watermark=snapshot.watermark)
+
+        changed_results = [pagination_results[index] for index in changed_indices]
+
+        with Progress() as progress:
+            task = progress.add_task(f"Syncing {modelType.__name__} details", total=len(changed_results))
+
+            def on_parsed(changed_index: int, parsed: T | None):
+                results[changed_indices[changed_index]] = parsed
+                progress.advance(task)
+
+            self.fetch_details(modelType, changed_results, on_parsed, refresh=self.incremental)
+
+        if self.incremental:
+            self.write_snapshot(modelType, pagination_results, results)
+
+        # keep the order of the pagination results, independent of completion order
+        return [
+            parsed for parsed in results
+            if parsed is not None
+        ]
+
+    def get_snapshot_name(self, modelType: Type[T]) -> str:
+        return f"{modelType.__name__}_snapshot"
+
+    def get_cached_snapshot(self, modelType: Type[T]) -> WikiSnapshot:
+        snapshot_raw = read_cache(self.get_snapshot_name(modelType), prefix=self.__class__.__name__)
+        if snapshot_raw is None:
+            return WikiSnapshot()
+
+        return WikiSnapshot.model_validate(snapshot_raw)
+
+    def write_snapshot(self, modelType: Type[T],
+                       pagination_results: list[WikiPaginatedModel], results: list[T | None]):
+        # failed entries are left out, so they are fetched again on the next run
+        snapshot = WikiSnapshot(entries={
+            result.link: WikiSnapshotEntry(
+                updated_at=result.updated_at,
+                version=result.version,
+                record=parsed.model_dump(mode='json'),
+            )
+            for result, parsed in zip(pagination_results, results)
+            if parsed is not None
+        })
+        snapshot.watermark = max((entry.updated_at for entry in snapshot.entries.values()), default=None)
+
+        write_cache(self.get_snapshot_name(modelType), snapshot, prefix=self.__class__.__name__)
 
 if __name__ == "__main__":
     WikiSync().sync(WikiItem)
@@ -0,0 +1,247 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from enum import StrEnum
+from typing import Any
+
+from patchright.async_api import BrowserContext, Locator, Page
+from structlog.stdlib import get_logger
+
+from utils.html_form import HtmlForm, parse_forms
+from utils.http import Transport
+
+UEX_BASE_URL = "https://uexcorp.space"
+
+EDIT_URL_TEMPLATE = ("{base_url}"
+                     "/data/submit/type/request?resource={resource}&request_action=edit&id_reference={id}")
+# UEX redirects here once a request was accepted
+SUBMITTED_URL_TEMPLATE = "{base_url}/data/home/type/request/ids_highlighted//"
+
+REQUEST_DATA_PREFIX = "request_data["
+AGREEMENT_ID = "agreement1"
+SUBMIT_BUTTON_TITLE = "Click to submit this report and go back to the reports list"
+SCREENSHOT_CONTENT_TYPE = "image/png"
+
+
+class SubmissionMethod(StrEnum):
+    # drives the edit form in a browser page, like a user would
+    BROWSER = "browser"
+    # posts the edit form as a multipart request, with the session cookies of the browser profile
+    HTTP = "http"
+
+
+class SubmissionBackend(ABC):
+    """
+    Loads, fills in and submits UEX edit forms.
+    The form handle returned by `load_form` is passed back to `fill` and `submit`.
+    """
+    # whether the edit forms are loaded in browser pages, otherwise the pages passed in are None
+    uses_pages: bool = True
+
+    def __init__(self, base_url: str = UEX_BASE_URL):
+        self.log = get_logger()
+        self.base_url = base_url.rstrip('/')
+        self.submitted_url = SUBMITTED_URL_TEMPLATE.format(base_url=self.base_url)
+
+    def get_edit_url(self, resource: str, id: int) -> str:
+        return EDIT_URL_TEMPLATE.format(base_url=self.base_url, resource=resource, id=id)
+
+    async def start(self, browser: BrowserContext):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def load_form(self, page: Page | None, edit_url: str) -> Any:
+        """
+        :return: the form handle
+        :raises Exception: if the edit form could not be loaded
+        """
+
+    @abstractmethod
+    async def fill(self, form: Any, fields: dict[str, str], screenshot_paths: list[str]):
+        """
+        Fills in the fields, attaches the screenshots and agrees to the modification of the request by UEX Staff.
+        """
+
+    @abstractmethod
+    async def submit(self, form: Any) -> bool:
+        """
+        :return: whether UEX accepted the submission
+        """
+
+
+class BrowserSubmissionBackend(SubmissionBackend):
+    """
+    Fills in the edit form in a browser page input by input, the form handle is the page.
+    """
+
+    async def load_form(self, page: Page | None, edit_url: str) -> Page:
+        await page.goto(edit_url)
+        return page
+
+    async def fill(self, page: Page, fields: dict[str, str], screenshot_paths: list[str]):
+        for name, value in fields.items():
+            await self.fill_field(page, name, value)
+
+        await self.add_screenshots(page, screenshot_paths)
+        await self.agree(page)
+
+    async def submit(self, page: Page) -> bool:
+        submit_button = page.locator(f'button[title="{SUBMIT_BUTTON_TITLE}"]')
+        await self.scroll_hover_click(submit_button)
+
+        try:
+            await page.wait_for_url(self.submitted_url)
+        except Exception as e:
+            self.log.exception("Submission failed", unexpected_url=page.url, exc_info=e)
+            return False
+
+        return True
+
+    @staticmethod
+    async def scroll_hover_click(locator: Locator):
+        await locator.scroll_into_view_if_needed()
+        await locator.hover()
+        await locator.click()
+
+    async def fill_field(self, page: Page, locator: str, value: str):
+        input_element = page.locator(f'input[name="{locator}"]')
+
+        await self.scroll_hover_click(input_element)
+        await input_element.fill(value)
+
+    async def add_screenshots(self, page: Page, screenshot_paths: list[str]):
+        async with page.expect_file_chooser() as file_chooser_info:
+            screenshot_input = page.locator('#btn_screenshot_attach')
+            await self.scroll_hover_click(screenshot_input)
+
+        file_chooser = await file_chooser_info.value
+        await file_chooser.set_files(screenshot_paths)
+
+    async def agree(self, page: Page):
+        # agree to possible request modification by UEX Staff
+        checkbox_input = page.locator(f'label[for="{AGREEMENT_ID}"]')
+        await self.scroll_hover_click(checkbox_input)
+
+
+@dataclass
+class HttpFormSubmission:
+    form: HtmlForm
+    # name/value pairs, filled in by `fill`
+    values: list[tuple[str, str]] = field(default_factory=list)
+    file_field: str | None = None
+    screenshot_paths: list[str] = field(default_factory=list)
+
+
+class HttpSubmissionBackend(SubmissionBackend):
+    """
+    Posts the edit form as a single multipart request, the way the browser would submit it,
+    without rendering the page or interacting with its inputs.
+    The session cookies are copied from the browser profile, so requests are made as the logged-in user.
+    """
+    uses_pages = False
+
+    def __init__(self, base_url: str = UEX_BASE_URL, transport: Transport | None = None):
+        """
+        :param transport: its session receives the cookies of the browser profile,
+            so it must not be the transport shared with the sync classes
+        """
+        super().__init__(base_url)
+        self.transport = transport or Transport()
+
+    async def start(self, browser: BrowserContext):
+        cookies = await browser.cookies(self.base_url)
+        for cookie in cookies:
+            self.transport.session.cookies.set(cookie['name'], cookie['value'],
+                                               domain=cookie['domain'], path=cookie['path'])
+
+        # sessions may be bound to the user agent that created them
+        if len(browser.pages) > 0:
+            self.transport.session.headers['User-Agent'] = await browser.pages[0].evaluate("navigator.userAgent")
+
+        self.log.info("> Copied session cookies", base_url=self.base_url, cookies=len(cookies))
+
+    async def stop(self):
+        self.transport.session.close()
+
+    async def load_form(self, page: Page | None, edit_url: str) -> HttpFormSubmission:
+        response = await asyncio.to_thread(self.transport.get, edit_url)
+        response.raise_for_status()
+
+        form = next((form for form in parse_forms(response.text, response.url)
+                     if form.has_input(REQUEST_DATA_PREFIX)), None)
+        if form is None:
+            # e.g. redirected to the login page, because the session expired
+            raise ValueError(f"No edit form found at {response.url}")
+
+        return HttpFormSubmission(form=form)
+
+    async def fill(self, form: HttpFormSubmission, fields: dict[str, str], screenshot_paths: list[str]):
+        html_form = form.form
+
+        for name in fields:
+            if html_form.get_input(name=name) is None:
+                raise ValueError(f"Input not found in the edit form: {name}")
+
+        agreement = html_form.get_input(id=AGREEMENT_ID)
+        if agreement is None:
+            raise ValueError(f"Agreement not found in the edit form: {AGREEMENT_ID}")
+
+        file_inputs = html_form.get_inputs('file')
+        if len(file_inputs) == 0:
+            raise ValueError("Screenshot input not found in the edit form")
+
+        submit_button = next((form_input for form_input in html_form.inputs
+                              if form_input.title == SUBMIT_BUTTON_TITLE), None)
+
+        values = [(name, value) for name, value in html_form.get_values()
+                  if name not in fields and name != agreement.name]
+        values.extend(fields.items())
+        values.append((agreement.name, agreement.value))
+        if submit_button is not None:
+            values.append((submit_button.name, submit_button.value))
+
+        form.values = values
+        form.file_field = file_inputs[0].name
+        form.screenshot_paths = screenshot_paths
+
+    async def submit(self, form: HttpFormSubmission) -> bool:
+        try:
+            response_url = await asyncio.to_thread(self.post, form)
+        except Exception as e:
+            self.log.exception("Submission failed", url=form.form.action, exc_info=e)
+            return False
+
+        if response_url != self.submitted_url:
+            self.log.error("Submission failed", unexpected_url=response_url)
+            return False
+
+        return True
+
+    def post(self, form: HttpFormSubmission) -> str:
+        """
+        Not retried, a repeated post could submit the request twice.
+        :return: the URL the submission was redirected to
+        """
+        with ExitStack() as stack:
+            files = [
+                (form.file_field, (os.path.basename(path), stack.enter_context(open(path, 'rb')),
+                                   SCREENSHOT_CONTENT_TYPE))
+                for path in form.screenshot_paths
+            ]
+
+            with self.transport.session.post(form.form.action, data=form.values, files=files,
+                                             timeout=self.transport.timeout) as response:
+                response.raise_for_status()
+                return response.url
+
+
+def create_submission_backend(method: SubmissionMethod, base_url: str = UEX_BASE_URL) -> SubmissionBackend:
+    if method == SubmissionMethod.HTTP:
+        return HttpSubmissionBackend(base_url)
+
+    return BrowserSubmissionBackend(base_url)
@@ -1,19 +1,29 @@
+import asyncio
 import os
-import re
 import shutil
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from enum import StrEnum
 from textwrap import dedent
+from typing import Any, Callable
 
-from patchright.sync_api import sync_playwright, Playwright, BrowserContext, Locator, Page
+from patchright.async_api import async_playwright, Playwright, BrowserContext, Page, FloatRect
 from structlog.stdlib import get_logger
 
 from models.update import Update, UpdateStatus
-from utils.cache import cache_dir
+from updaters.submission import SubmissionMethod, UEX_BASE_URL, create_submission_backend
+from utils.cache import cache_dir, find_cache_prefix, read_cache, read_cache_meta
+from utils.json_index import JsonIndex
+from utils.proof import JsonProofDocument, validate_proof_rendering
+from utils.rate_limit import RateLimiter
+
+try:
+    from PIL import Image
+except ImportError:  # optional, only required for `combine_proofs`
+    Image = None
 
 BROWSER_USER_DATA_PATH = os.getenv('LOCALAPPDATA') + r"\Google\Chrome\User Data"
 
-EDIT_URL_TEMPLATE = ("https://uexcorp.space"
-                     "/data/submit/type/request?resource={resource}&request_action=edit&id_reference={id}")
 WIKI_API_URL_TEMPLATE = ("https://api.star-citizen.wiki"
                          "/api/v2/{resource}/{name}?locale=en_EN")
 # UPDATE_REASON_TEMPLATE = ("UUID was not set, updating from Wiki => {wiki_api_url}"
@@ -23,8 +33,33 @@ UPDATE_REASON_TEMPLATE = ("[AUTOMATED UPDATE] Updated Fields: {changed_fields}"
                           " - Data Source: {wiki_api_url}"
                           " # GitHub: https://github.com/FatalMerlin/uex-uuid-updater")
 
+WIKI_DATA_KEY = "data"
+
 SCREENSHOT_DIR_NAME = "screenshots"
 SCREENSHOT_DIR = os.path.join(cache_dir, SCREENSHOT_DIR_NAME)
+COMBINED_SCREENSHOT_NAME = "combined.png"
+
+# enlarges the JSON text, so the clipped proofs are readable
+PROOF_FONT_SCALE = 2.5
+# lines above the changed value kept in its proof, showing the enclosing keys
+PROOF_CONTEXT_LINES = 2
+PROOF_PADDING = 16
+COMBINED_PROOF_GAP = 8
+
+# called with the update and whether it was submitted, once per update
+UpdateCallback = Callable[[Update, bool], None]
+
+
+@dataclass
+class PreparedUpdate:
+    update: Update
+    # the page holding the edit form, None if the submission backend does not use pages
+    page: Page | None
+    # handle of the loaded edit form, see `SubmissionBackend.load_form`
+    form: Any
+    changed_keys: list[str]
+    wiki_api_url: str
+    screenshot_paths: list[str]
 
 
 class UEXUpdater:
@@ -32,132 +67,211 @@ class UEXUpdater:
         VEHICLE = "vehicles"
         ITEM = "items"
 
-    def __init__(self, use_cache: bool = True):
-        self.main_page = None
+    class ProofRenderer(StrEnum):
+        # screenshots of the live response in a browser page
+        BROWSER = "browser"
+        # images drawn from the response cached by `WikiSync`, falls back to the browser if it is not cached
+        CACHE = "cache"
+
+    def __init__(self, use_cache: bool = True, pages: int = 1, max_submissions_per_minute: float | None = None,
+                 lookahead: int = 0, combine_proofs: bool = False,
+                 proof_renderer: ProofRenderer = ProofRenderer.BROWSER,
+                 submission_method: SubmissionMethod = SubmissionMethod.BROWSER, base_url: str = UEX_BASE_URL):
+        """
+        :param pages: number of pages submitting updates in parallel, all sharing the one persistent browser
+        :param max_submissions_per_minute: global submission rate of all pages, None for no limit
+        :param lookahead: number of upcoming updates prepared in background pages, 0 to prepare each update
+            on its page right before submitting it
+        :param combine_proofs: uploads the proofs of an update as a single image, requires Pillow
+        :param proof_renderer: how proofs are captured, rendering them from the cache requires Pillow
+        :param submission_method: how edit forms are submitted, posting them over HTTP needs no pages,
+            `pages` is then the number of concurrent submissions
+        :param base_url: of UEX, e.g. a local stand-in form server
+        """
+        if pages < 1:
+            raise ValueError(f"Invalid number of pages: {pages}")
+        if lookahead < 0:
+            raise ValueError(f"Invalid lookahead: {lookahead}")
+        if combine_proofs and Image is None:
+            raise ValueError("combining proofs requires the 'Pillow' package")
+        if proof_renderer == UEXUpdater.ProofRenderer.CACHE:
+            validate_proof_rendering()
+
+        self.pages: list[Page] = []
         self.browser = None
         self.context = None
         self.log = get_logger()
         self.use_cache = use_cache
-
-    def __enter__(self):
-        return self.start()
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.stop()
-
-    def start(self):
-        self.context = self.setup_context()
-        self.browser = self.setup_browser()
-        self.main_page = self.setup_pages()
+        self.page_count = pages
+        self.submission_limiter = RateLimiter(max_submissions_per_minute)
+        self.lookahead = lookahead
+        self.combine_proofs = combine_proofs
+        self.proof_renderer = proof_renderer
+        self.uploaded_bytes = 0
+        self.backend = create_submission_backend(submission_method, base_url)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    async def start(self):
+        self.context = await self.setup_context()
+        self.browser = await self.setup_browser()
+        # also needed without pages, for the session cookies and the proofs
+        await self.backend.start(self.browser)
+        self.pages = await self.setup_pages()
 
         return self
 
-    def stop(self):
-        self.browser.close()
-        self.context.stop()
+    async def stop(self):
+        await self.backend.stop()
+        await self.browser.close()
+        await self.context.stop()
 
     @staticmethod
-    def setup_context() -> Playwright:
-        return sync_playwright().start()
+    async def setup_context() -> Playwright:
+        return await async_playwright().start()
 
-    def setup_browser(self) -> BrowserContext:
-        return self.context.chromium.launch_persistent_context(
+    async def setup_browser(self) -> BrowserContext:
+        return await self.context.chromium.launch_persistent_context(
             BROWSER_USER_DATA_PATH,
             channel="chrome", headless=False, slow_mo=0
         )
 
-    def setup_pages(self):
-        page, discard = self.browser.pages[0], self.browser.pages[1:]
-        for excess in discard:
-            excess.close()
+    async def setup_pages(self) -> list[Page]:
+        # the pipeline prepares every update on its own page, the submitters need none
+        if not self.backend.uses_pages or self.lookahead > 0:
+            return []
 
-        page.goto("about:blank")
-        return page
+        pages, discard = self.browser.pages[:self.page_count], self.browser.pages[self.page_count:]
+        for excess in discard:
+            await excess.close()
 
-    @staticmethod
-    def scroll_hover_click(locator: Locator):
-        locator.scroll_into_view_if_needed()
-        locator.hover()
-        locator.click()
+        while len(pages) < self.page_count:
+            pages.append(await self.browser.new_page())
 
-    def fill_field(self, locator: str, value: str):
-        # self.main_page.fill(locator, value)
-        input_element = self.main_page.locator(f'input[name="{locator}"]')
+        for page in pages:
+            await page.goto("about:blank")
 
-        self.scroll_hover_click(input_element)
-        input_element.fill(value)
+        return pages
 
-    def get_wiki_proof_for_change(self, page: Page, changed_key: str, source_path: str) -> str | None:
+    async def get_wiki_proof_for_change(self, page: Page, changed_key: str, source_path: str,
+                                        screenshot_dir: str, json_index: JsonIndex) -> str | None:
         try:
-            offset_start = 0
-            last_match_length = 0
-            text_content = page.locator('pre').text_content()
-            offset_text = text_content
-
-            for path in source_path.split('.'):
-                match = re.search(rf'"{path}":', offset_text)
-                if match is None:
-                    return None
-
-                offset_start += match.end()
-                last_match_length = match.end() - match.start()
-                offset_text = text_content[offset_start:]
-
-            offset_end_match = re.search(r'\n', offset_text)
-            if offset_end_match is None:
+            path = self.get_proof_path(json_index, source_path)
+            if path is None:
+                self.log.warn("> Proof path not found", changed_key=changed_key, source_path=source_path)
                 return None
 
-            offset_end = offset_end_match.start() + offset_start
-            offset_start -= last_match_length
+            span = json_index.get(path)
+
+            offset_start, offset_end = json_index.get_utf16_offset(span.start), json_index.get_utf16_offset(span.end)
 
-            page.evaluate(
+            # enlarges the text instead of zooming the page, so the selection rectangle stays in viewport pixels
+            region = await page.evaluate(
                 dedent(
                     f"""
-                    let text = document.querySelector('pre').childNodes[0];
-                    let selection = window.getSelection();
-                    selection
-                        .setBaseAndExtent(
-                            text, {offset_start},
-                            text, {offset_end}
-                        );
-                    document.body.style.zoom=2.5;
-                    let range = selection.getRangeAt(0);
-                    let rect = range.getBoundingClientRect();
-                    let absoluteTop = rect.top + window.scrollY;
-                    window.scrollTo({{top: Math.min(absoluteTop - 200, 0)}});
+                    () => {{
+                        let pre = document.querySelector('pre');
+                        pre.style.fontSize = '{PROOF_FONT_SCALE * 100:.0f}%';
+                        let selection = window.getSelection();
+                        selection
+                            .setBaseAndExtent(
+                                pre.childNodes[0], {offset_start},
+                                pre.childNodes[0], {offset_end}
+                            );
+                        let rect = selection.getRangeAt(0).getBoundingClientRect();
+                        window.scrollTo({{top: Math.max(rect.top + window.scrollY - 200, 0)}});
+                        let range = selection.getRangeAt(0);
+                        rect = range.getBoundingClientRect();
+                        // `lineHeight` is 'normal' by default, the first rect of a multi-line selection is a single line
+                        let lineRect = range.getClientRects()[0] || rect;
+                        return {{
+                            top: rect.top, bottom: rect.bottom, right: rect.right,
+                            line_height: parseFloat(getComputedStyle(pre).lineHeight) || lineRect.height,
+                            width: window.innerWidth, height: window.innerHeight,
+                        }};
+                    }}
                     """
                 )
             )
 
-            screenshot_path = os.path.join(SCREENSHOT_DIR, f"{changed_key}.png")
-            page.screenshot(type='png', path=screenshot_path)
+            screenshot_path = os.path.join(screenshot_dir, f"{changed_key}.png")
+            await page.screenshot(type='png', path=screenshot_path, clip=self.get_proof_clip(region))
 
             return screenshot_path
         except Exception as e:
             self.log.error("Failed to get proof", changed_key=changed_key, source_path=source_path, exc_info=e)
             return None
 
-    def get_wiki_proof(self, wiki_api_url: str, update: Update, changed_keys: list[str]) -> list[str] | None:
+    @staticmethod
+    def get_proof_path(json_index: JsonIndex, source_path: str) -> str | None:
+        # detail responses wrap the entity in `data`, the source path is relative to the entity
+        for path in (f"{WIKI_DATA_KEY}.{source_path}", source_path):
+            if path in json_index:
+                return path
+
+        return None
+
+    @staticmethod
+    def get_proof_clip(region: dict[str, float]) -> FloatRect:
+        """
+        Clips the screenshot to the selected lines, with the lines above it for context
+        and the full indentation, so the keys of the path stay readable.
+        """
+        line_height = region['line_height']
+        top = max(region['top'] - line_height * PROOF_CONTEXT_LINES - PROOF_PADDING, 0)
+        bottom = min(region['bottom'] + PROOF_PADDING, region['height'])
+        right = min(region['right'] + PROOF_PADDING, region['width'])
+
+        return {'x': 0, 'y': top, 'width': max(right, 1), 'height': max(bottom - top, 1)}
+
+    async def get_wiki_proof(self, wiki_api_url: str, update: Update, changed_keys: list[str]) -> list[str] | None:
         """
-        Takes a screenshot of the Wiki API response and returns it as a base64 encoded string.
+        Captures a proof of the Wiki API response for each changed key.
         :param wiki_api_url: The URL of the Wiki API endpoint
-        :return: The screenshot as a base64 encoded string
+        :return: The paths of the screenshots, combined into one if `combine_proofs` is set
         """
+        screenshot_paths = None
+        # one directory per update, reused by later runs, so parallel pages never touch each other's screenshots
+        screenshot_dir = get_screenshot_dir(update.id)
+        os.makedirs(screenshot_dir, exist_ok=True)
+
+        if self.proof_renderer == UEXUpdater.ProofRenderer.CACHE:
+            # drawing is CPU bound, so it runs off the event loop, next to the pages of other updates
+            screenshot_paths = await asyncio.to_thread(
+                self.render_cached_proof, wiki_api_url, update, changed_keys, screenshot_dir)
+            if screenshot_paths is None:
+                self.log.info("> No cached proof, taking screenshots", id=update.id, wiki_api_url=wiki_api_url)
+
+        if screenshot_paths is None:
+            screenshot_paths = await self.take_wiki_proof_screenshots(wiki_api_url, update, changed_keys,
+                                                                      screenshot_dir)
+        if screenshot_paths is None:
+            return None
+
+        if self.combine_proofs and len(screenshot_paths) > 1:
+            return [combine_screenshots(screenshot_paths, os.path.join(screenshot_dir, COMBINED_SCREENSHOT_NAME))]
+
+        return screenshot_paths
+
+    async def take_wiki_proof_screenshots(self, wiki_api_url: str, update: Update, changed_keys: list[str],
+                                          screenshot_dir: str) -> list[str] | None:
         screenshot_paths: list[str] = []
 
         try:
-            if os.path.exists(SCREENSHOT_DIR):
-                shutil.rmtree(SCREENSHOT_DIR)
-            if not os.path.exists(SCREENSHOT_DIR):
-                os.makedirs(SCREENSHOT_DIR)
-
-            with self.browser.new_page() as page:
-                page.goto(wiki_api_url)
+            async with await self.browser.new_page() as page:
+                await page.goto(wiki_api_url)
+                # parsed once, all changed keys are resolved from the same index
+                json_index = JsonIndex(await page.locator('pre').text_content())
 
                 for changed_key in changed_keys:
-                    screenshot = self.get_wiki_proof_for_change(
+                    screenshot = await self.get_wiki_proof_for_change(
                         page, changed_key,
-                        update.change_source_mapping[changed_key])
+                        update.change_source_mapping[changed_key],
+                        screenshot_dir, json_index)
 
                     if screenshot is None:
                         return None
@@ -169,29 +283,189 @@ class UEXUpdater:
 
         return screenshot_paths
 
-    def add_screenshots(self, screenshot_paths: list[str]):
-        with self.main_page.expect_file_chooser() as file_chooser_info:
-            screenshot_input = self.main_page.locator('#btn_screenshot_attach')
-            self.scroll_hover_click(screenshot_input)
+    def render_cached_proof(self, wiki_api_url: str, update: Update, changed_keys: list[str],
+                            screenshot_dir: str) -> list[str] | None:
+        """
+        Draws the proofs from the response cached by `WikiSync`, without loading the page.
+        :return: The paths of the images, or None if the response is not cached or a key is missing from it
+        """
+        prefix = find_cache_prefix(wiki_api_url)
+        cached = read_cache(wiki_api_url, prefix=prefix) if prefix is not None else None
+        if cached is None:
+            return None
 
-        file_chooser = file_chooser_info.value
-        file_chooser.set_files(screenshot_paths)
+        meta = read_cache_meta(wiki_api_url, prefix=prefix) or {}
+        header = wiki_api_url
+        if meta.get('fetched_at') is not None:
+            fetched_at = datetime.fromtimestamp(meta['fetched_at'], timezone.utc).isoformat(timespec='seconds')
+            header = f"{wiki_api_url} (fetched {fetched_at})"
+        screenshot_paths: list[str] = []
 
-    def agree(self):
-        # agree to possible request modification by UEX Staff
-        checkbox_input = self.main_page.locator('label[for="agreement1"]')
-        self.scroll_hover_click(checkbox_input)
+        try:
+            document = JsonProofDocument(cached)
 
-    def submit(self, dry_run: bool = False):
-        if dry_run:
-            return
+            for changed_key in changed_keys:
+                path = self.get_proof_path(document.index, update.change_source_mapping[changed_key])
+                if path is None:
+                    return None
 
-        submit_button = self.main_page.locator(
-            'button[title="Click to submit this report and go back to the reports list"]'
-        )
-        self.scroll_hover_click(submit_button)
+                screenshot_paths.append(document.render(
+                    path, os.path.join(screenshot_dir, f"{changed_key}.png"), header=header))
+        except Exception:
+            self.log.exception("Failed to render proofs", wiki_api_url=wiki_api_url)
+            return None
+
+        return screenshot_paths
+
+    async def update_all(self, resource_type: ResourceType, updates: list[Update], dry_run: bool = False,
+                         on_complete: UpdateCallback | None = None):
+        """
+        Spreads the updates across the pages through a shared work queue.
+        A failing update or a crashed page only fails the update it was working on.
+        :param on_complete: called on the event loop as each update completes, in completion order
+        """
+        if self.lookahead > 0:
+            await self.update_pipelined(resource_type, updates, dry_run, on_complete)
+        else:
+            queue: asyncio.Queue[Update] = asyncio.Queue()
+            for update in updates:
+                queue.put_nowait(update)
+
+            await asyncio.gather(*[
+                self.run_worker(index, resource_type, queue, dry_run, on_complete)
+                for index in range(self.page_count)
+            ])
+
+        self.log.info("Submissions finished", uploaded_bytes=self.uploaded_bytes)
+
+    async def run_worker(self, index: int, resource_type: ResourceType, queue: asyncio.Queue[Update],
+                         dry_run: bool, on_complete: UpdateCallback | None):
+        while not queue.empty():
+            update = queue.get_nowait()
+            page = self.pages[index] if self.backend.uses_pages else None
+
+            try:
+                submitted = await self.update(page, resource_type, update, dry_run=dry_run)
+            except Exception as e:
+                self.log.error("Failed to update", id=update.id, name=update.name, page=index, error=e,
+                               unexpected=True)
+                submitted = False
+
+            if on_complete is not None:
+                on_complete(update, submitted)
+
+            if page is not None and page.is_closed():
+                self.log.warn("> Page closed, replacing it", page=index)
+                try:
+                    self.pages[index] = await self.browser.new_page()
+                except Exception as e:
+                    # the remaining pages keep working through the queue
+                    self.log.error("Failed to replace page, stopping its worker", page=index, error=e)
+                    return
+
+    async def update_pipelined(self, resource_type: ResourceType, updates: list[Update], dry_run: bool,
+                               on_complete: UpdateCallback | None):
+        """
+        Prepares the edit forms and proofs of the next `lookahead` updates in background pages,
+        while up to `pages` prepared updates are filled in and submitted.
+        Preparations still running when the pipeline stops are cancelled and their pages closed.
+        """
+        prepared_queue: asyncio.Queue[tuple[Update, asyncio.Task] | None] = asyncio.Queue()
+        # at most `lookahead` preparations run at once, the producer waits for one to be taken and finished
+        # before starting another one
+        lookahead_slots = asyncio.Semaphore(self.lookahead)
+        # started, but not yet taken by a submitter
+        unconsumed: set[asyncio.Task] = set()
+
+        async def produce():
+            for update in updates:
+                await lookahead_slots.acquire()
+
+                preparation = asyncio.create_task(self.prepare_on_new_page(resource_type, update))
+                unconsumed.add(preparation)
+                prepared_queue.put_nowait((update, preparation))
+
+            for _ in range(self.page_count):
+                prepared_queue.put_nowait(None)
+
+        async def consume(index: int):
+            while (item := await prepared_queue.get()) is not None:
+                update, preparation = item
+                unconsumed.discard(preparation)
+
+                try:
+                    try:
+                        prepared = await preparation
+                    finally:
+                        # the next preparation starts while this one is submitted
+                        lookahead_slots.release()
+
+                    submitted = await self.complete_prepared(prepared, dry_run)
+                except Exception as e:
+                    self.log.error("Failed to update", id=update.id, name=update.name, worker=index, error=e,
+                                   unexpected=True)
+                    submitted = False
+
+                if on_complete is not None:
+                    on_complete(update, submitted)
+
+        workers = [asyncio.create_task(produce()), *[
+            asyncio.create_task(consume(index)) for index in range(self.page_count)
+        ]]
+
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # only reached early if something failed, the prepared work is not submitted anymore
+            for task in [*workers, *unconsumed]:
+                task.cancel()
+            await asyncio.gather(*workers, *unconsumed, return_exceptions=True)
+
+            for preparation in unconsumed:
+                if preparation.cancelled() or preparation.exception() is not None:
+                    continue
+
+                prepared = preparation.result()
+                if isinstance(prepared, PreparedUpdate) and prepared.page is not None:
+                    await prepared.page.close()
+
+    async def prepare_on_new_page(self, resource_type: ResourceType, update: Update) -> PreparedUpdate | bool:
+        page = await self.browser.new_page() if self.backend.uses_pages else None
 
-    def update(self, resource_type: ResourceType, update: Update, dry_run: bool = False) -> bool:
+        try:
+            prepared = await self.prepare(page, resource_type, update)
+        except BaseException:
+            # also on cancellation, a stale edit form must not stay open
+            if page is not None:
+                await page.close()
+            raise
+
+        if not isinstance(prepared, PreparedUpdate) and page is not None:
+            await page.close()
+
+        return prepared
+
+    async def complete_prepared(self, prepared: PreparedUpdate | bool, dry_run: bool) -> bool:
+        if not isinstance(prepared, PreparedUpdate):
+            return prepared
+
+        try:
+            # the page may have crashed or been closed while the update was waiting in the pipeline,
+            # its edit form is gone then, the lookahead slot of the preparation is already released
+            if prepared.page is not None and prepared.page.is_closed():
+                self.log.warn("Skipped prepared update, its page was closed", id=prepared.update.id)
+                return False
+
+            return await self.complete(prepared, dry_run=dry_run)
+        finally:
+            if prepared.page is not None and not prepared.page.is_closed():
+                await prepared.page.close()
+
+    async def prepare(self, page: Page | None, resource_type: ResourceType, update: Update) -> PreparedUpdate | bool:
+        """
+        Loads the edit form and captures the proofs of the update, both at the same time.
+        :return: the prepared update, or whether the update is done without submitting it
+        """
         if update.status != UpdateStatus.PENDING:
             self.log.warn("Skipped update", id=update.id, status=update.status)
             return False
@@ -208,37 +482,104 @@ class UEXUpdater:
         self.log.info("Updating", resource_type=resource_type.value, id=update.id,
                       changed_keys=changed_keys, changes=changes)
 
-        edit_url = EDIT_URL_TEMPLATE.format(resource=resource_type.value, id=update.id)
+        edit_url = self.backend.get_edit_url(resource_type.value, update.id)
         # wiki_api_url = WIKI_API_URL_TEMPLATE.format(resource=resource_type.value, name=urllib.parse.quote_plus(update.name))
         wiki_api_url = update.source_link
 
-        self.main_page.goto(edit_url)
+        edit_form = asyncio.create_task(self.backend.load_form(page, edit_url))
+        screenshot_paths = None
 
         try:
-            screenshot_paths = self.get_wiki_proof(wiki_api_url, update, changed_keys)
-            if screenshot_paths is None or len(screenshot_paths) != len(changed_keys):
-                return False
+            screenshot_paths = await self.get_wiki_proof(wiki_api_url, update, changed_keys)
         except Exception as e:
             self.log.exception("Failed to get screenshot", wiki_api_url=wiki_api_url, exc_info=e)
+        finally:
+            if screenshot_paths is None:
+                # without proofs the update is not submitted, so the edit form is not needed anymore
+                edit_form.cancel()
+                await asyncio.gather(edit_form, return_exceptions=True)
+
+        # the edit form may have finished loading before the proofs failed, so the cancellation is no indicator
+        if screenshot_paths is None:
             return False
 
-        for key in changed_keys:
-            self.fill_field(f"request_data[{key}]", str(update.changes.__dict__[key]))
-        self.fill_field("details", UPDATE_REASON_TEMPLATE.format(
-            changed_fields=", ".join(changed_keys), wiki_api_url=wiki_api_url))
+        form = await edit_form
+
+        return PreparedUpdate(update=update, page=page, form=form, changed_keys=changed_keys, wiki_api_url=wiki_api_url,
+                              screenshot_paths=screenshot_paths)
+
+    async def complete(self, prepared: PreparedUpdate, dry_run: bool = False) -> bool:
+        """
+        Fills in and submits the loaded edit form of a prepared update.
+        """
+        update = prepared.update
+
+        fields = {
+            f"request_data[{key}]": str(update.changes.__dict__[key]) for key in prepared.changed_keys
+        }
+        fields["details"] = UPDATE_REASON_TEMPLATE.format(
+            changed_fields=", ".join(prepared.changed_keys), wiki_api_url=prepared.wiki_api_url)
 
-        self.add_screenshots(screenshot_paths)
-        self.agree()
+        await self.backend.fill(prepared.form, fields, prepared.screenshot_paths)
+
+        uploaded_bytes = sum(os.path.getsize(path) for path in prepared.screenshot_paths)
 
         if dry_run:
+            self.log.info("> Prepared submission", id=update.id, dry_run=dry_run,
+                          screenshots=len(prepared.screenshot_paths), uploaded_bytes=uploaded_bytes)
             return True
 
-        self.submit()
+        # shared by all pages, so adding pages does not raise the submission rate
+        await self.submission_limiter.acquire()
 
-        try:
-            self.main_page.wait_for_url("https://uexcorp.space/data/home/type/request/ids_highlighted//")
-        except Exception as e:
-            self.log.exception("Submission failed", unexpected_url=self.main_page.url, exc_info=e)
+        if not await self.backend.submit(prepared.form):
             return False
 
+        self.uploaded_bytes += uploaded_bytes
+        self.log.info("> Submitted", id=update.id, screenshots=len(prepared.screenshot_paths),
+                      uploaded_bytes=uploaded_bytes)
+
         return True
+
+    async def update(self, page: Page | None, resource_type: ResourceType, update: Update,
+                     dry_run: bool = False) -> bool:
+        prepared = await self.prepare(page, resource_type, update)
+        if not isinstance(prepared, PreparedUpdate):
+            return prepared
+
+        return await self.complete(prepared, dry_run=dry_run)
+
+
+def get_screenshot_dir(update_id: int) -> str:
+    return os.path.join(SCREENSHOT_DIR, str(update_id))
+
+
+def remove_screenshots(update_id: int):
+    """
+    Removes the proofs of an update, once it is archived they are not reused anymore.
+    """
+    shutil.rmtree(get_screenshot_dir(update_id), ignore_errors=True)
+
+
+def combine_screenshots(screenshot_paths: list[str], combined_path: str) -> str:
+    """
+    Stacks the screenshots vertically into a single image.
+    """
+    screenshots = [Image.open(path) for path in screenshot_paths]
+
+    try:
+        width = max(screenshot.width for screenshot in screenshots)
+        height = sum(screenshot.height for screenshot in screenshots) + COMBINED_PROOF_GAP * (len(screenshots) - 1)
+        combined = Image.new('RGB', (width, height), 'white')
+
+        top = 0
+        for screenshot in screenshots:
+            combined.paste(screenshot, (0, top))
+            top += screenshot.height + COMBINED_PROOF_GAP
+
+        combined.save(combined_path, optimize=True)
+    finally:
+        for screenshot in screenshots:
+            screenshot.close()
+
+    return combined_path
@@ -1,6 +1,8 @@
-import json
+import argparse
 import os
-import re
+import threading
+import time
+from datetime import timedelta
 from typing import Any, TypeVar
 
 from pydantic import BaseModel
@@ -9,84 +11,260 @@ from structlog.stdlib import get_logger
 
 from models.base.uex_base_model import UEXBaseModel
 from models.update import Update, UpdateList
+from utils.cache_backends import CacheBackend, CacheEntry, FileSystemCacheBackend, SQLiteCacheBackend, \
+    MemoryLRUCache, SQLITE_FILE_NAME
+from utils.codec import Compression, MissingCodecError, compress, decompress, validate_compression, loads, dumps
 
 _log = get_logger()
 cache_dir = os.path.join(os.getcwd(), 'cache')
+# total size of all fetched responses in the cache, least recently used entries are evicted by `prune`
+cache_max_size = int(os.getenv('CACHE_MAX_SIZE_MB', '512')) * 1024 * 1024
+
+# how long a `404 Not Found` is remembered before the URL is requested again
+NEGATIVE_CACHE_TTL = timedelta(hours=1)
 
 T = TypeVar('T', bound=UEXBaseModel)
 
+_backend: CacheBackend | None = None
+_memory: MemoryLRUCache | None = None
+_compression: Compression = Compression.NONE
+# compressions of skipped entries that were already reported
+_missing_codecs: set[Compression] = set()
+_configure_lock = threading.Lock()
 
-def ensure_cache_dir(*, prefix: str | None = None) -> str:
-    if not os.path.exists(cache_dir):
-        os.makedirs(cache_dir)
 
-    if prefix:
-        prefix_cache_dir = os.path.join(cache_dir, prefix)
-        if not os.path.exists(prefix_cache_dir):
-            os.makedirs(prefix_cache_dir)
-        return prefix_cache_dir
+def configure_cache(backend: str | CacheBackend | None = None, memory_entries: int | None = None,
+                    compression: str | Compression | None = None):
+    """
+    Selects the cache backend for this run.
+    :param backend: `filesystem`, `sqlite` or a `CacheBackend` instance,
+                    defaults to the `CACHE_BACKEND` environment variable or `filesystem`
+    :param memory_entries: The number of decoded entries kept in memory,
+                           defaults to the `CACHE_MEMORY_ENTRIES` environment variable or 1024
+    :param compression: How new entries are compressed, `none`, `gzip` or `zstd`,
+                        defaults to the `CACHE_COMPRESSION` environment variable or `none`.
+                        Existing entries are always read, whatever compression they were written with,
+                        entries whose compression package is missing are skipped, but kept.
+    """
+    global _backend, _memory, _compression
 
-    return cache_dir
+    backend = backend or os.getenv('CACHE_BACKEND', 'filesystem')
+    memory_entries = memory_entries if memory_entries is not None else int(os.getenv('CACHE_MEMORY_ENTRIES', '1024'))
+    compression = Compression(compression or os.getenv('CACHE_COMPRESSION', Compression.NONE))
+    validate_compression(compression)
 
+    if isinstance(backend, str):
+        match backend:
+            case 'filesystem':
+                backend = FileSystemCacheBackend(cache_dir)
+            case 'sqlite':
+                backend = SQLiteCacheBackend(os.path.join(cache_dir, SQLITE_FILE_NAME))
+            case _:
+                raise ValueError(f"Invalid cache backend: '{backend}'")
 
-def get_cache_file_for_updates_by_model(modelType: T, *, prefix: str | None = None):
-    cache_dir = ensure_cache_dir(prefix=prefix)
+    with _configure_lock:
+        if _backend is not None:
+            _backend.close()
 
-    cache_file_name = modelType.__name__ + '_updates' + '.json'
+        _backend = backend
+        _memory = MemoryLRUCache(memory_entries)
+        _compression = compression
 
-    return os.path.join(cache_dir, cache_file_name)
 
+def get_cache_backend() -> CacheBackend:
+    if _backend is None:
+        configure_cache()
 
-def get_cache_file(url: str, *, prefix: str | None = None):
-    cache_dir = ensure_cache_dir(prefix=prefix)
+    return _backend
 
-    cache_file_name = url.split('/')[-1] or url.split('/')[-2]
-    cache_file_name = re.sub(r'\W', '_', cache_file_name)
 
-    if not cache_file_name.endswith('.json'):
-        cache_file_name += '.json'
+def get_cache_name(url_or_model_type: str | type[T]) -> str:
+    if isinstance(url_or_model_type, str):
+        return url_or_model_type
 
-    return os.path.join(cache_dir, cache_file_name)
+    return url_or_model_type.__name__ + '_updates'
 
 
 def write_cache_updates(contents: list[UpdateList[T]], *, prefix: str | None = None):
     write_cache(T, contents, prefix=prefix)
 
 
-def write_cache(url_or_model_type: str | T, contents: str | Any, *, prefix: str | None = None):
-    if isinstance(contents, BaseModel):
-        contents = contents.model_dump_json(exclude_none=True)
+def write_cache(url_or_model_type: str | T, contents: bytes | Any, *, prefix: str | None = None,
+                meta: dict[str, Any] | None = None, decoded: Any | None = None):
+    """
+    :param contents: Raw JSON bytes, which are stored unchanged, a model or a JSON serializable value
+    :param decoded: The decoded value of raw `contents`, which is kept in memory for subsequent reads
+    """
+    backend = get_cache_backend()
+    name = get_cache_name(url_or_model_type)
+
+    if isinstance(contents, bytes):
+        encoded = contents
+        decoded_value = decoded
+    elif isinstance(contents, BaseModel):
+        encoded = contents.model_dump_json(exclude_none=True).encode('utf-8')
+        # models are cached as the JSON value that is read back, not as the model itself
+        decoded_value = None
     else:
-        contents = json.dumps(contents)
+        encoded = dumps(contents)
+        decoded_value = contents
+
+    if decoded_value is None:
+        _memory.invalidate(name, prefix=prefix)
+    else:
+        _memory.put(name, decoded_value, prefix=prefix)
+
+    backend.write(name, compress(encoded, _compression), prefix=prefix)
 
-    file = get_cache_file(url_or_model_type, prefix=prefix) \
-        if isinstance(url_or_model_type, str) \
-        else get_cache_file_for_updates_by_model(url_or_model_type, prefix=prefix)
+    if meta is not None:
+        backend.write_meta(name, meta, prefix=prefix)
 
-    with open(file, 'w') as f:
-        f.write(contents)
-        f.flush()
-        f.close()
+
+def write_cache_meta(url: str, meta: dict[str, Any], *, prefix: str | None = None):
+    """
+    Stores metadata next to a cache entry, e.g. the `ETag` and `Last-Modified` validators of the response.
+    """
+    get_cache_backend().write_meta(url, meta, prefix=prefix)
+
+
+def read_cache_meta(url: str, *, prefix: str | None = None) -> dict[str, Any] | None:
+    return get_cache_backend().read_meta(url, prefix=prefix)
 
 
 def read_cache(url_or_model_type: str | type[T], *, prefix: str | None = None):
-    file = get_cache_file(url_or_model_type, prefix=prefix) \
-        if isinstance(url_or_model_type, str) \
-        else get_cache_file_for_updates_by_model(url_or_model_type, prefix=prefix)
+    backend = get_cache_backend()
+    name = get_cache_name(url_or_model_type)
+
+    cached = _memory.get(name, prefix=prefix)
+    if cached is not None:
+        return cached
 
-    if not os.path.exists(file):
+    contents = backend.read(name, prefix=prefix)
+    if not contents:
         return None
 
     try:
-        with open(file, 'r') as f:
-            contents = f.read()
-            f.close()
+        parsed = loads(decompress(contents))
+    except MissingCodecError as e:
+        # the entry is valid, it is kept for when the package is installed again
+        if e.compression not in _missing_codecs:
+            _missing_codecs.add(e.compression)
+            _log.warn("Skipped cache entries, their compression is not installed", name=name, prefix=prefix,
+                      compression=e.compression, extra=e.extra)
+        return None
+    # corrupted JSON or compressed data
+    except (ValueError, OSError, EOFError):
+        backend.delete(name, prefix=prefix)
+        _log.warn(f"Removed corrupted cache entry", name=name, prefix=prefix)
+        return None
 
-        if not contents:
-            return None
+    backend.touch(name, prefix=prefix)
+    _memory.put(name, parsed, prefix=prefix)
+    return parsed
 
-        return json.loads(contents)
-    except json.JSONDecodeError or OSError:
-        os.remove(file)
-        _log.warn(f"Removed corrupted cache file", file=file)
-        return None
+
+def find_cache_prefix(url: str) -> str | None:
+    """
+    Finds the prefix a URL was cached with, e.g. to read a response without knowing which sync fetched it.
+    """
+    return get_cache_backend().find_prefix(url)
+
+
+def delete_cache(url: str, *, prefix: str | None = None):
+    backend = get_cache_backend()
+    _memory.invalidate(url, prefix=prefix)
+    backend.delete(url, prefix=prefix)
+
+
+def write_negative_cache(url: str, status_code: int, *, prefix: str | None = None):
+    """
+    Remembers that fetching the URL failed with the given status code for `NEGATIVE_CACHE_TTL`.
+    """
+    delete_cache(url, prefix=prefix)
+    write_cache_meta(url, {
+        'status_code': status_code,
+        'fetched_at': time.time(),
+        'expires_at': time.time() + NEGATIVE_CACHE_TTL.total_seconds(),
+    }, prefix=prefix)
+
+
+def is_expired(meta: dict[str, Any] | None, ttl: timedelta | None) -> bool:
+    """
+    Checks whether a cache entry is older than `ttl`,
+    entries without a fetch time or without a TTL never expire.
+    """
+    if ttl is None or meta is None or meta.get('fetched_at') is None:
+        return False
+
+    return time.time() - meta['fetched_at'] > ttl.total_seconds()
+
+
+def is_negative_cached(meta: dict[str, Any] | None) -> bool:
+    return meta is not None \
+        and meta.get('status_code') is not None \
+        and not is_expired(meta, NEGATIVE_CACHE_TTL)
+
+
+def prune(max_size: int | None = None, compact: bool = False) -> tuple[int, int]:
+    """
+    Removes expired responses and negative cache entries,
+    then evicts the least recently used responses until the cache fits into `max_size` bytes.
+    Only entries with metadata are considered, i.e. fetched responses, never update lists or screenshots.
+    :param max_size: The maximum size in bytes, defaults to `cache_max_size`
+    :param compact: Compacts the backend even if nothing was removed, e.g. a full `VACUUM` of the SQLite database,
+                    otherwise it is only compacted after removing entries
+    :return: The number of removed entries and the number of freed bytes
+    """
+    backend = get_cache_backend()
+    max_size = cache_max_size if max_size is None else max_size
+    now = time.time()
+    removed = 0
+    freed = 0
+    entries: list[CacheEntry] = []
+
+    for entry in backend.entries():
+        expires_at = entry.meta.get('expires_at')
+
+        # metadata without a response and without an expiry is left over from a removed entry
+        if (expires_at is not None and expires_at < now) or (not entry.has_contents and expires_at is None):
+            backend.delete_entry(entry)
+            removed += 1
+            freed += entry.size
+            continue
+
+        # negative cache entries are tiny and expire on their own
+        if entry.has_contents:
+            entries.append(entry)
+
+    total_size = sum(entry.size for entry in entries)
+
+    for entry in sorted(entries, key=lambda e: e.used_at):
+        if total_size <= max_size:
+            break
+
+        backend.delete_entry(entry)
+        removed += 1
+        freed += entry.size
+        total_size -= entry.size
+
+    if _memory is not None:
+        _memory.clear()
+    if removed > 0 or compact:
+        backend.compact()
+    _log.info("Cache pruned", removed=removed, freed_bytes=freed, size_bytes=total_size, max_size_bytes=max_size)
+    return removed, freed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manages the response cache")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    prune_parser = subparsers.add_parser('prune', help="Removes expired and least recently used entries")
+    prune_parser.add_argument('--max-size-mb', type=int, default=None,
+                              help="Maximum cache size in MB, defaults to CACHE_MAX_SIZE_MB or 512")
+    parser.add_argument('--backend', choices=['filesystem', 'sqlite'], default=None,
+                        help="Cache backend, defaults to CACHE_BACKEND or filesystem")
+    args = parser.parse_args()
+    configure_cache(args.backend)
+
+    if args.command == 'prune':
+        prune(None if args.max_size_mb is None else args.max_size_mb * 1024 * 1024, compact=True)
@@ -0,0 +1,427 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable
+
+from structlog.stdlib import get_logger
+
+_log = get_logger()
+
+META_FILE_SUFFIX = '.meta.json'
+CACHE_INDEX_FILE_NAME = 'index.jsonl'
+CACHE_SHARD_LENGTH = 2
+SQLITE_FILE_NAME = 'cache.sqlite3'
+
+
+def is_url(url_or_name: str) -> bool:
+    return '://' in url_or_name
+
+
+def get_cache_key(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    # backend specific reference, passed back to `CacheBackend.delete_entry`
+    ref: Hashable
+    size: int
+    used_at: float
+    meta: dict[str, Any]
+    has_contents: bool
+
+
+class CacheBackend(ABC):
+    """
+    Storage for cache entries, addressed by a prefix and a URL or name.
+    Every entry consists of the raw contents and an optional metadata dict,
+    which can also exist on its own, e.g. for negative cache entries.
+    """
+
+    @abstractmethod
+    def read(self, name: str, *, prefix: str | None = None) -> bytes | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(self, name: str, contents: bytes, *, prefix: str | None = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_meta(self, name: str, *, prefix: str | None = None) -> dict[str, Any] | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def write_meta(self, name: str, meta: dict[str, Any], *, prefix: str | None = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, name: str, *, prefix: str | None = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def touch(self, name: str, *, prefix: str | None = None):
+        """
+        Marks the entry as used for the LRU eviction in `prune`.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def entries(self) -> list[CacheEntry]:
+        """
+        Lists all entries with metadata, i.e. fetched responses and negative cache entries.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_entry(self, entry: CacheEntry):
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_prefix(self, url: str) -> str | None:
+        """
+        Finds the prefix a URL was cached with.
+        """
+        raise NotImplementedError
+
+    def compact(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileSystemCacheBackend(CacheBackend):
+    """
+    Stores every entry as a file below `directory`.
+    URLs are hashed and sharded by the first characters of the hash, so different URLs never share a file
+    and no single directory grows too large. Named entries, e.g. update lists, keep a human-readable file name.
+    An append-only `index.jsonl` maps the URLs to their files.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._ensured_dirs: set[str] = set()
+        self._index: dict[str, str] | None = None
+        self._index_lock = threading.Lock()
+
+    def ensure_dir(self, *, prefix: str | None = None) -> str:
+        directory = os.path.join(self.directory, prefix) if prefix else self.directory
+
+        # directories are only created once per run instead of on every read and write
+        if directory not in self._ensured_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._ensured_dirs.add(directory)
+
+        return directory
+
+    def get_file(self, name: str, *, prefix: str | None = None) -> str:
+        if not is_url(name):
+            file_name = re.sub(r'\W', '_', name)
+            if not file_name.endswith('.json'):
+                file_name += '.json'
+
+            return os.path.join(self.ensure_dir(prefix=prefix), file_name)
+
+        cache_key = get_cache_key(name)
+        shard = cache_key[:CACHE_SHARD_LENGTH]
+        directory = self.ensure_dir(prefix=os.path.join(prefix, shard) if prefix else shard)
+
+        return os.path.join(directory, cache_key + '.json')
+
+    def get_meta_file(self, name: str, *, prefix: str | None = None) -> str:
+        return self.get_file(name, prefix=prefix).removesuffix('.json') + META_FILE_SUFFIX
+
+    @staticmethod
+    def write_file(file: str, contents: bytes):
+        # written to a temporary file first, so an interrupted write never leaves a truncated entry
+        temp_file = f"{file}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(contents)
+            f.flush()
+        os.replace(temp_file, file)
+
+    def read(self, name: str, *, prefix: str | None = None) -> bytes | None:
+        try:
+            with open(self.get_file(name, prefix=prefix), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name: str, contents: bytes, *, prefix: str | None = None):
+        file = self.get_file(name, prefix=prefix)
+        self.write_file(file, contents)
+
+        if is_url(name):
+            self.add_to_index(name, file)
+
+    def read_meta(self, name: str, *, prefix: str | None = None) -> dict[str, Any] | None:
+        file = self.get_meta_file(name, prefix=prefix)
+
+        try:
+            with open(file, 'rb') as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, OSError):
+            os.remove(file)
+            _log.warn(f"Removed corrupted cache meta file", file=file)
+            return None
+
+    def write_meta(self, name: str, meta: dict[str, Any], *, prefix: str | None = None):
+        self.write_file(self.get_meta_file(name, prefix=prefix), json.dumps(meta).encode('utf-8'))
+
+    def delete(self, name: str, *, prefix: str | None = None):
+        for file in [self.get_file(name, prefix=prefix), self.get_meta_file(name, prefix=prefix)]:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def touch(self, name: str, *, prefix: str | None = None):
+        # the modification time tracks the last use
+        try:
+            os.utime(self.get_file(name, prefix=prefix))
+        except FileNotFoundError:
+            pass
+
+    def entries(self) -> list[CacheEntry]:
+        entries: list[CacheEntry] = []
+
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                if not file_name.endswith(META_FILE_SUFFIX):
+                    continue
+
+                meta_file = os.path.join(root, file_name)
+                data_file = meta_file.removesuffix(META_FILE_SUFFIX) + '.json'
+                has_contents = os.path.exists(data_file)
+
+                try:
+                    with open(meta_file, 'rb') as f:
+                        meta = json.loads(f.read())
+                except (json.JSONDecodeError, OSError):
+                    meta = {}
+
+                entries.append(CacheEntry(
+                    ref=meta_file,
+                    size=os.path.getsize(meta_file) + (os.path.getsize(data_file) if has_contents else 0),
+                    used_at=os.path.getmtime(data_file if has_contents else meta_file),
+                    meta=meta,
+                    has_contents=has_contents,
+                ))
+
+        return entries
+
+    def delete_entry(self, entry: CacheEntry):
+        meta_file = entry.ref
+        for file in [meta_file.removesuffix(META_FILE_SUFFIX) + '.json', meta_file]:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def load_index(self) -> dict[str, str]:
+        """
+        Loads the index from full URLs to their cache files, relative to `directory`.
+        Later lines override earlier ones.
+        """
+        with self._index_lock:
+            if self._index is not None:
+                return self._index
+
+            self._index = {}
+            index_file = os.path.join(self.directory, CACHE_INDEX_FILE_NAME)
+
+            if os.path.exists(index_file):
+                with open(index_file, 'r') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                            self._index[entry['url']] = entry['file']
+                        except (json.JSONDecodeError, KeyError):
+                            # incomplete last line of an interrupted run
+                            continue
+
+            return self._index
+
+    def add_to_index(self, url: str, file: str):
+        index = self.load_index()
+        relative_file = os.path.relpath(file, self.directory)
+
+        with self._index_lock:
+            if index.get(url) == relative_file:
+                return
+
+            index[url] = relative_file
+            with open(os.path.join(self.ensure_dir(), CACHE_INDEX_FILE_NAME), 'a') as f:
+                f.write(json.dumps({'url': url, 'file': relative_file}) + '\n')
+
+    def find_prefix(self, url: str) -> str | None:
+        relative_file = self.load_index().get(url)
+        if relative_file is None or not os.path.exists(os.path.join(self.directory, relative_file)):
+            return None
+
+        # <prefix>/<shard>/<key>.json
+        return os.path.dirname(os.path.dirname(relative_file)) or None
+
+    def compact(self):
+        """
+        Rewrites the index without duplicate lines and without entries whose files were removed.
+        """
+        index = self.load_index()
+
+        with self._index_lock:
+            for url, relative_file in list(index.items()):
+                if not os.path.exists(os.path.join(self.directory, relative_file)):
+                    del index[url]
+
+            index_file = os.path.join(self.ensure_dir(), CACHE_INDEX_FILE_NAME)
+            self.write_file(index_file, ''.join(
+                json.dumps({'url': url, 'file': relative_file}) + '\n'
+                for url, relative_file in index.items()
+            ).encode('utf-8'))
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Stores all entries in a single SQLite database instead of one file per entry.
+    """
+
+    def __init__(self, file: str):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        self.file = file
+        self._lock = threading.Lock()
+        # shared by the fetch worker threads, access is serialized by `_lock`
+        self._connection = sqlite3.connect(file, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                prefix TEXT NOT NULL,
+                name TEXT NOT NULL,
+                contents BLOB,
+                meta TEXT,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (prefix, name)
+            )
+            """
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS entries_name ON entries (name)')
+
+    def _execute(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def read(self, name: str, *, prefix: str | None = None) -> bytes | None:
+        rows = self._execute('SELECT contents FROM entries WHERE prefix = ? AND name = ?', (prefix or '', name))
+        return rows[0][0] if rows else None
+
+    def write(self, name: str, contents: bytes, *, prefix: str | None = None):
+        self._execute(
+            """
+            INSERT INTO entries (prefix, name, contents, used_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (prefix, name) DO UPDATE SET contents = excluded.contents, used_at = excluded.used_at
+            """,
+            (prefix or '', name, contents, time.time())
+        )
+
+    def read_meta(self, name: str, *, prefix: str | None = None) -> dict[str, Any] | None:
+        rows = self._execute('SELECT meta FROM entries WHERE prefix = ? AND name = ?', (prefix or '', name))
+        return json.loads(rows[0][0]) if rows and rows[0][0] is not None else None
+
+    def write_meta(self, name: str, meta: dict[str, Any], *, prefix: str | None = None):
+        self._execute(
+            """
+            INSERT INTO entries (prefix, name, meta, used_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (prefix, name) DO UPDATE SET meta = excluded.meta
+            """,
+            (prefix or '', name, json.dumps(meta), time.time())
+        )
+
+    def delete(self, name: str, *, prefix: str | None = None):
+        self._execute('DELETE FROM entries WHERE prefix = ? AND name = ?', (prefix or '', name))
+
+    def touch(self, name: str, *, prefix: str | None = None):
+        self._execute('UPDATE entries SET used_at = ? WHERE prefix = ? AND name = ?',
+                      (time.time(), prefix or '', name))
+
+    def entries(self) -> list[CacheEntry]:
+        rows = self._execute(
+            """
+            SELECT prefix, name, length(contents), length(meta), used_at, meta
+            FROM entries WHERE meta IS NOT NULL
+            """
+        )
+
+        return [
+            CacheEntry(
+                ref=(prefix, name),
+                size=(contents_size or 0) + meta_size,
+                used_at=used_at,
+                meta=json.loads(meta),
+                has_contents=contents_size is not None,
+            )
+            for prefix, name, contents_size, meta_size, used_at, meta in rows
+        ]
+
+    def delete_entry(self, entry: CacheEntry):
+        prefix, name = entry.ref
+        self._execute('DELETE FROM entries WHERE prefix = ? AND name = ?', (prefix, name))
+
+    def find_prefix(self, url: str) -> str | None:
+        rows = self._execute('SELECT prefix FROM entries WHERE name = ? AND contents IS NOT NULL', (url,))
+        return (rows[0][0] or None) if rows else None
+
+    def compact(self):
+        self._execute('VACUUM')
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class MemoryLRUCache:
+    """
+    In-process tier above the cache backend, keeps the most recently used decoded entries,
+    so repeated reads of the same entry within a run skip reading and decoding.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, *, prefix: str | None = None) -> Any | None:
+        key = (prefix or '', name)
+
+        with self._lock:
+            if key not in self._entries:
+                return None
+
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, name: str, value: Any, *, prefix: str | None = None):
+        if self.max_entries <= 0:
+            return
+
+        key = (prefix or '', name)
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name: str, *, prefix: str | None = None):
+        with self._lock:
+            self._entries.pop((prefix or '', name), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
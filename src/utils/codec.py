@@ -0,0 +1,109 @@
+import gzip
+import json
+from enum import StrEnum
+from typing import Any
+
+try:
+    import zstandard
+except ImportError:  # optional, only required for `Compression.ZSTD`
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:  # optional, parses and serializes JSON several times faster than `json`
+    orjson = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+class Compression(StrEnum):
+    NONE = "none"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+
+# optional package and extra of the project required by each compression
+COMPRESSION_PACKAGES: dict[Compression, tuple[str, str]] = {
+    Compression.ZSTD: ('zstandard', 'zstd'),
+}
+
+
+class MissingCodecError(Exception):
+    """
+    The contents are compressed with a compression whose optional package is not installed,
+    unlike `ValueError`, the contents are not corrupted.
+    """
+
+    def __init__(self, compression: Compression):
+        package, extra = COMPRESSION_PACKAGES[compression]
+        super().__init__(f"{compression.value} compression requires the '{package}' package, "
+                         f"install the '{extra}' extra")
+        self.compression = compression
+        self.extra = extra
+
+
+def validate_compression(compression: Compression):
+    if compression == Compression.ZSTD and zstandard is None:
+        raise ValueError("zstd compression requires the 'zstandard' package")
+
+
+def compress(contents: bytes, compression: Compression, level: int | None = None) -> bytes:
+    match compression:
+        case Compression.NONE:
+            return contents
+        case Compression.GZIP:
+            return gzip.compress(contents, compresslevel=6 if level is None else level)
+        case Compression.ZSTD:
+            validate_compression(compression)
+            return zstandard.ZstdCompressor(level=3 if level is None else level).compress(contents)
+
+    raise ValueError(f"Invalid compression: '{compression}'")
+
+
+def detect_compression(contents: bytes) -> Compression:
+    if contents.startswith(GZIP_MAGIC):
+        return Compression.GZIP
+    if contents.startswith(ZSTD_MAGIC):
+        return Compression.ZSTD
+
+    return Compression.NONE
+
+
+def decompress(contents: bytes) -> bytes:
+    """
+    Decompresses the contents based on their magic bytes, uncompressed contents are returned as-is.
+    Plain JSON never starts with either magic, so existing uncompressed caches keep working.
+    :raises ValueError | OSError | EOFError: if the compressed contents are corrupted
+    :raises MissingCodecError: if the package required to decompress the contents is not installed
+    """
+    match detect_compression(contents):
+        case Compression.GZIP:
+            return gzip.decompress(contents)
+        case Compression.ZSTD:
+            if zstandard is None:
+                raise MissingCodecError(Compression.ZSTD)
+            try:
+                # the content size is not always part of the frame, e.g. for streamed frames
+                return zstandard.ZstdDecompressor().decompressobj().decompress(contents)
+            except zstandard.ZstdError as e:
+                raise ValueError("Invalid zstd data") from e
+
+    return contents
+
+
+def loads(contents: bytes | str) -> Any:
+    """
+    Parses JSON directly from the raw bytes, using orjson if it is installed.
+    """
+    if orjson is not None:
+        return orjson.loads(contents)
+
+    return json.loads(contents)
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    return json.dumps(value).encode('utf-8')
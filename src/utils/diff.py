@@ -0,0 +1,115 @@
+import numbers
+from enum import StrEnum
+from typing import Any, Sequence
+
+try:
+    import numpy
+except ImportError:  # optional, only required for `DiffMode.COLUMNAR`
+    numpy = None
+
+# values of one matched source/target pair, in the order of the mapping plan
+DiffRow = Sequence[Any]
+
+# exact types, as abstract `numbers.Real` checks cost more than the comparison itself
+COLUMNAR_TYPES = frozenset({int, float, type(None)})
+
+
+class DiffMode(StrEnum):
+    SCALAR = "scalar"
+    COLUMNAR = "columnar"
+
+
+def validate_diff_mode(diff_mode: DiffMode):
+    if diff_mode == DiffMode.COLUMNAR and numpy is None:
+        raise ValueError("columnar diff mode requires the 'numpy' package")
+
+
+def is_real(value: Any) -> bool:
+    # `bool` is a `numbers.Real`, but flags are compared exactly
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def is_changed(source_value: Any, target_value: Any, tolerance: float = 0.0) -> bool:
+    """
+    Decides whether the target value has to be updated to the source value.
+    Missing and zero source values are ignored, numbers within the tolerance are considered equal.
+    """
+    if source_value is None:
+        return False
+
+    if isinstance(source_value, numbers.Number) and source_value == 0:
+        return False
+
+    if tolerance and is_real(source_value) and is_real(target_value):
+        return abs(source_value - target_value) > tolerance
+
+    return target_value != source_value
+
+
+def diff_scalar(source_rows: list[DiffRow], target_rows: list[DiffRow],
+                tolerance: float = 0.0) -> list[list[bool]]:
+    return [
+        [is_changed(source_value, target_value, tolerance) for source_value, target_value in zip(source_row, target_row)]
+        for source_row, target_row in zip(source_rows, target_rows)
+    ]
+
+
+def is_numeric_column(column: Sequence[Any]) -> bool:
+    return set(map(type, column)) <= COLUMNAR_TYPES
+
+
+def to_float_array(column: Sequence[Any]):
+    return numpy.fromiter((numpy.nan if value is None else value for value in column),
+                          dtype=numpy.float64, count=len(column))
+
+
+def diff_numeric_column(source_column: Sequence[Any], target_column: Sequence[Any], tolerance: float):
+    source = to_float_array(source_column)
+    target = to_float_array(target_column)
+
+    # a missing target never equals a present source, as `isclose` is false for NaN
+    equal = numpy.isclose(source, target, rtol=0.0, atol=tolerance)
+    return ~numpy.isnan(source) & (source != 0) & ~equal
+
+
+def diff_columnar(source_rows: list[DiffRow], target_rows: list[DiffRow],
+                  tolerance: float = 0.0) -> list[list[bool]]:
+    """
+    Same result as `diff_scalar`, but compares purely numeric fields as NumPy columns.
+    Fields holding any other value, e.g. strings or flags, are compared with `is_changed`.
+    """
+    validate_diff_mode(DiffMode.COLUMNAR)
+    if len(source_rows) == 0:
+        return []
+
+    changed_columns = []
+
+    for source_column, target_column in zip(zip(*source_rows), zip(*target_rows)):
+        if is_numeric_column(source_column) and is_numeric_column(target_column):
+            changed_columns.append(diff_numeric_column(source_column, target_column, tolerance))
+        else:
+            changed_columns.append(numpy.array([
+                is_changed(source_value, target_value, tolerance)
+                for source_value, target_value in zip(source_column, target_column)
+            ], dtype=bool))
+
+    return numpy.stack(changed_columns, axis=1).tolist()
+
+
+def diff(source_rows: list[DiffRow], target_rows: list[DiffRow],
+         diff_mode: DiffMode = DiffMode.SCALAR, tolerance: float = 0.0) -> list[list[bool]]:
+    """
+    Compares matched source and target values field by field.
+    :param source_rows: mapped source values per entity
+    :param target_rows: current target values per entity, in the same field order
+    :param diff_mode: whether to compare per value or per column
+    :param tolerance: absolute difference up to which numbers are considered equal
+    :return: per entity and field, whether the target has to be updated
+    """
+    match diff_mode:
+        case DiffMode.SCALAR:
+            return diff_scalar(source_rows, target_rows, tolerance)
+        case DiffMode.COLUMNAR:
+            return diff_columnar(source_rows, target_rows, tolerance)
+
+    raise ValueError(f"Invalid diff mode: '{diff_mode}'")
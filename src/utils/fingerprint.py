@@ -0,0 +1,63 @@
+import hashlib
+from types import CodeType
+from typing import Any, Callable
+
+from pydantic_core import to_json
+
+
+def get_callable_signature(function: Callable) -> str:
+    """
+    Identifies a callable by its code instead of its identity, so it is stable across runs,
+    and changes whenever the function body or a value it closes over changes, even for lambdas.
+    """
+    code = getattr(function, '__code__', None)
+    if code is None:
+        return f"{getattr(function, '__module__', '')}.{getattr(function, '__qualname__', repr(function))}"
+
+    digest = hashlib.sha256()
+    update_code_digest(digest, code)
+
+    for cell in getattr(function, '__closure__', None) or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            # the variable is not bound yet
+            digest.update(b'<empty>')
+            continue
+
+        if callable(value):
+            digest.update(get_callable_signature(value).encode('utf-8'))
+        else:
+            digest.update(to_json(value, fallback=repr))
+        digest.update(b'\0')
+
+    return digest.hexdigest()
+
+
+def update_code_digest(digest: 'hashlib._Hash', code: CodeType):
+    """
+    Hashes nested code objects, e.g. of comprehensions, by their content,
+    their repr holds a memory address and a file path.
+    """
+    digest.update(code.co_code)
+    digest.update(repr((code.co_names, code.co_varnames)).encode('utf-8'))
+
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            update_code_digest(digest, const)
+        else:
+            digest.update(repr(const).encode('utf-8'))
+        digest.update(b'\0')
+
+
+def get_fingerprint(*values: Any) -> str:
+    """
+    Hashes JSON serializable values, including pydantic models, into a stable fingerprint.
+    """
+    digest = hashlib.sha256()
+
+    for value in values:
+        digest.update(to_json(value, fallback=repr))
+        digest.update(b'\0')
+
+    return digest.hexdigest()
@@ -0,0 +1,132 @@
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+# input types that are not submitted as plain name/value pairs
+UNSUBMITTED_INPUT_TYPES = frozenset({'file', 'button', 'reset', 'image', 'submit'})
+
+
+@dataclass
+class HtmlFormInput:
+    name: str
+    type: str
+    value: str
+    id: str | None = None
+    checked: bool = False
+    multiple: bool = False
+    title: str | None = None
+
+
+@dataclass
+class HtmlForm:
+    action: str
+    method: str
+    inputs: list[HtmlFormInput] = field(default_factory=list)
+
+    def get_input(self, *, name: str | None = None, id: str | None = None) -> HtmlFormInput | None:
+        return next((
+            form_input for form_input in self.inputs
+            if (name is None or form_input.name == name) and (id is None or form_input.id == id)
+        ), None)
+
+    def get_inputs(self, type: str) -> list[HtmlFormInput]:
+        return [form_input for form_input in self.inputs if form_input.type == type]
+
+    def has_input(self, prefix: str) -> bool:
+        return any(form_input.name.startswith(prefix) for form_input in self.inputs)
+
+    def get_values(self) -> list[tuple[str, str]]:
+        """
+        :return: the name/value pairs the browser would submit without any user input
+        """
+        return [
+            (form_input.name, form_input.value)
+            for form_input in self.inputs
+            if form_input.type not in UNSUBMITTED_INPUT_TYPES
+            and (form_input.type not in ('checkbox', 'radio') or form_input.checked)
+        ]
+
+
+class HtmlFormParser(HTMLParser):
+    """
+    Collects the forms of a page with their named inputs, textareas, selects and buttons.
+    """
+
+    def __init__(self, base_url: str):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.forms: list[HtmlForm] = []
+        self.form: HtmlForm | None = None
+        # the textarea or select whose content is being read
+        self.pending: HtmlFormInput | None = None
+        self.text: list[str] = []
+        self.option_seen = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        attributes = {name: value if value is not None else '' for name, value in attrs}
+
+        if tag == 'form':
+            self.form = HtmlForm(
+                action=urljoin(self.base_url, attributes.get('action') or self.base_url),
+                method=(attributes.get('method') or 'get').lower(),
+            )
+            self.forms.append(self.form)
+            return
+
+        if self.form is None:
+            return
+
+        name = attributes.get('name')
+
+        if tag == 'input' and name:
+            self.form.inputs.append(HtmlFormInput(
+                name=name,
+                type=(attributes.get('type') or 'text').lower(),
+                value=attributes.get('value', 'on' if attributes.get('type') in ('checkbox', 'radio') else ''),
+                id=attributes.get('id'),
+                checked='checked' in attributes,
+                multiple='multiple' in attributes,
+                title=attributes.get('title'),
+            ))
+        elif tag == 'button' and name:
+            self.form.inputs.append(HtmlFormInput(
+                name=name, type=(attributes.get('type') or 'submit').lower(), value=attributes.get('value', ''),
+                id=attributes.get('id'), title=attributes.get('title'),
+            ))
+        elif tag == 'textarea' and name:
+            self.pending = HtmlFormInput(name=name, type='textarea', value='', id=attributes.get('id'))
+            self.form.inputs.append(self.pending)
+            self.text = []
+        elif tag == 'select' and name:
+            self.pending = HtmlFormInput(name=name, type='select', value='', id=attributes.get('id'))
+            self.form.inputs.append(self.pending)
+            self.option_seen = False
+        elif tag == 'option' and self.pending is not None and self.pending.type == 'select':
+            # the first option is selected unless another one is marked as selected
+            if 'selected' in attributes or not self.option_seen:
+                self.pending.value = attributes.get('value', '')
+            self.option_seen = True
+
+    def handle_data(self, data: str):
+        if self.pending is not None and self.pending.type == 'textarea':
+            self.text.append(data)
+
+    def handle_endtag(self, tag: str):
+        if tag == 'form':
+            self.form = None
+        elif tag == 'textarea' and self.pending is not None:
+            self.pending.value = ''.join(self.text)
+            self.pending = None
+        elif tag == 'select':
+            self.pending = None
+
+
+def parse_forms(html: str, base_url: str) -> list[HtmlForm]:
+    """
+    :param base_url: URL of the page, relative form actions are resolved against it
+    """
+    parser = HtmlFormParser(base_url)
+    parser.feed(html)
+    parser.close()
+
+    return parser.forms
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+from structlog.stdlib import get_logger
+from urllib3.util import make_headers
+
+_log = get_logger()
+
+# gzip and deflate are always supported,
+# br and zstd are only offered if urllib3 is able to decode them
+ACCEPT_ENCODING = make_headers(accept_encoding=True)['accept-encoding']
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+@dataclass
+class TransportStats:
+    requests: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    failures: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class Transport:
+    """
+    Shared HTTP transport for the sync classes.
+    Keeps connections alive in a pool, applies connect/read timeouts
+    and retries transient failures with exponential backoff, honouring `Retry-After`.
+    """
+
+    def __init__(self, pool_size: int = 32, connect_timeout: float = 5, read_timeout: float = 30,
+                 max_retries: int = 4, backoff_factor: float = 0.5, max_backoff: float = 60):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.stats = TransportStats()
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _count(self, **counters: int):
+        with self._stats_lock:
+            for name, value in counters.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def get_backoff(self, attempt: int, response: Response | None = None) -> float:
+        if response is not None and (retry_after := response.headers.get('Retry-After')) is not None:
+            retry_after = retry_after.strip()
+
+            if retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return min(max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0), self.max_backoff)
+            except (TypeError, ValueError):
+                pass
+
+        backoff = self.backoff_factor * (2 ** attempt)
+        # jitter avoids all workers retrying in lockstep
+        return min(backoff + random.uniform(0, backoff / 2), self.max_backoff)
+
+    def get(self, url: str, *, headers: dict[str, str] | None = None) -> Response:
+        """
+        Performs a GET request, retrying connection errors and retryable status codes.
+        :return: The last response, which may still have a retryable status code once all retries are used up
+        :raises requests.exceptions.RequestException: if the last attempt failed without a response
+        """
+        attempt = 0
+
+        while True:
+            self._count(requests=1)
+
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                if attempt >= self.max_retries:
+                    self._count(failures=1)
+                    raise
+
+                backoff = self.get_backoff(attempt)
+                _log.warn("Request failed, retrying", url=url, attempt=attempt + 1, backoff=backoff, error=e)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+
+                if response.status_code == 429:
+                    self._count(rate_limited=1)
+
+                if attempt >= self.max_retries:
+                    self._count(failures=1)
+                    return response
+
+                backoff = self.get_backoff(attempt, response)
+                _log.warn("Request failed, retrying", url=url, attempt=attempt + 1, backoff=backoff,
+                          status_code=response.status_code)
+                response.close()
+
+            self._count(retries=1)
+            attempt += 1
+            time.sleep(backoff)
+
+
+_default_transport: Transport | None = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport() -> Transport:
+    global _default_transport
+
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+
+    return _default_transport
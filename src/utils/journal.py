@@ -0,0 +1,78 @@
+import os
+import threading
+from typing import Any
+
+from structlog.stdlib import get_logger
+
+from utils.cache import cache_dir
+from utils.codec import loads, dumps
+
+_log = get_logger()
+
+JOURNAL_FILE_SUFFIX = '.journal.jsonl'
+
+
+class Journal:
+    """
+    Append-only JSONL journal next to a cache entry.
+    Every record is flushed and synced to disk before `append` returns,
+    so an interrupted run loses at most the record that was being written.
+    """
+
+    def __init__(self, name: str, *, prefix: str | None = None):
+        directory = os.path.join(cache_dir, prefix) if prefix else cache_dir
+        os.makedirs(directory, exist_ok=True)
+
+        self.file = os.path.join(directory, name + JOURNAL_FILE_SUFFIX)
+        self.length = 0
+        self._lock = threading.Lock()
+        self.terminate_incomplete_record()
+
+    def terminate_incomplete_record(self):
+        """
+        Ends an incomplete last record of an interrupted run with a newline,
+        so it does not corrupt the next appended record.
+        """
+        if not os.path.exists(self.file) or os.path.getsize(self.file) == 0:
+            return
+
+        with open(self.file, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+
+    def append(self, record: dict[str, Any]):
+        with self._lock:
+            with open(self.file, 'ab') as f:
+                f.write(dumps(record) + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.length += 1
+
+    def replay(self) -> list[dict[str, Any]]:
+        if not os.path.exists(self.file):
+            return []
+
+        records: list[dict[str, Any]] = []
+
+        with open(self.file, 'rb') as f:
+            for line in f:
+                try:
+                    records.append(loads(line))
+                except ValueError:
+                    # the last line of an interrupted run may be incomplete
+                    _log.warn("Skipped corrupted journal record", file=self.file, record=line)
+
+        self.length = len(records)
+        return records
+
+    def truncate(self):
+        """
+        Clears the journal, only call this once its records are persisted elsewhere.
+        """
+        with self._lock:
+            if os.path.exists(self.file):
+                os.remove(self.file)
+
+            self.length = 0
@@ -0,0 +1,133 @@
+import bisect
+import json
+import re
+from dataclasses import dataclass
+
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+LITERALS = ('true', 'false', 'null')
+# characters outside the basic multilingual plane, which take two UTF-16 code units
+ASTRAL = re.compile('[\U00010000-\U0010FFFF]')
+
+
+@dataclass(frozen=True)
+class JsonSpan:
+    # start of the key, or of the value for array elements and the root
+    start: int
+    value_start: int
+    # exclusive
+    end: int
+
+
+class JsonIndex:
+    """
+    Maps every JSON path of a document to its character span in the original text, in a single pass.
+    Paths are dotted keys and array indices, e.g. `data.sizes.beam` or `data.ports.0.size`,
+    the root value has the empty path.
+    """
+
+    def __init__(self, text: str):
+        """
+        :raises ValueError: if the text is not valid JSON
+        """
+        self.text = text
+        self.spans: dict[str, JsonSpan] = {}
+        self.astral_positions = [match.start() for match in ASTRAL.finditer(text)]
+
+        position = self.skip_whitespace(0)
+        end = self.parse_value(position, '', position)
+        if self.skip_whitespace(end) != len(text):
+            raise ValueError(f"Unexpected data after the JSON value at position {end}")
+
+    def get(self, path: str) -> JsonSpan | None:
+        return self.spans.get(path)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.spans
+
+    def get_utf16_offset(self, position: int) -> int:
+        """
+        Converts a character position to the UTF-16 offset used by the DOM, e.g. for text selections.
+        """
+        return position + bisect.bisect_left(self.astral_positions, position)
+
+    def skip_whitespace(self, position: int) -> int:
+        return WHITESPACE.match(self.text, position).end()
+
+    def expect(self, position: int, character: str) -> int:
+        if not self.text.startswith(character, position):
+            raise ValueError(f"Expected '{character}' at position {position}")
+
+        return position + 1
+
+    def parse_value(self, position: int, path: str, start: int) -> int:
+        """
+        :param position: start of the value
+        :param start: start of the span, i.e. of the key holding the value
+        :return: the end of the value
+        """
+        character = self.text[position:position + 1]
+
+        if character == '{':
+            end = self.parse_object(position, path)
+        elif character == '[':
+            end = self.parse_array(position, path)
+        elif character == '"':
+            end = self.parse_string(position)
+        elif match := NUMBER.match(self.text, position):
+            end = match.end()
+        else:
+            literal = next((literal for literal in LITERALS if self.text.startswith(literal, position)), None)
+            if literal is None:
+                raise ValueError(f"Invalid JSON value at position {position}")
+            end = position + len(literal)
+
+        self.spans[path] = JsonSpan(start, position, end)
+        return end
+
+    def parse_string(self, position: int) -> int:
+        if not self.text.startswith('"', position):
+            raise ValueError(f"Expected a string at position {position}")
+
+        match = STRING.match(self.text, position)
+        if match is None:
+            raise ValueError(f"Unterminated string at position {position}")
+
+        return match.end()
+
+    def parse_object(self, position: int, path: str) -> int:
+        position = self.skip_whitespace(position + 1)
+        if self.text.startswith('}', position):
+            return position + 1
+
+        while True:
+            key_start = position
+            key_end = self.parse_string(key_start)
+            key = self.text[key_start + 1:key_end - 1]
+            if '\\' in key:
+                key = json.loads(self.text[key_start:key_end])
+
+            position = self.skip_whitespace(self.expect(self.skip_whitespace(key_end), ':'))
+            position = self.skip_whitespace(self.parse_value(position, f"{path}.{key}" if path else key, key_start))
+
+            if self.text.startswith('}', position):
+                return position + 1
+
+            position = self.skip_whitespace(self.expect(position, ','))
+
+    def parse_array(self, position: int, path: str) -> int:
+        position = self.skip_whitespace(position + 1)
+        if self.text.startswith(']', position):
+            return position + 1
+
+        index = 0
+        while True:
+            element_path = f"{path}.{index}" if path else str(index)
+            position = self.skip_whitespace(self.parse_value(position, element_path, position))
+
+            if self.text.startswith(']', position):
+                return position + 1
+
+            position = self.skip_whitespace(self.expect(position, ','))
+            index += 1
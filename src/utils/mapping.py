@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from utils.fingerprint import get_callable_signature
+
+Accessor = Callable[[Any], Any]
+
+
+def compile_path(path: str) -> Accessor:
+    """
+    Builds an accessor for a dotted attribute path, equivalent to `get_attr_by_path`,
+    with the path split once instead of on every call.
+    """
+    parts = tuple(path.split('.'))
+
+    if len(parts) == 1:
+        name = parts[0]
+        return lambda obj: getattr(obj, name, None) if obj is not None else None
+
+    def accessor(obj: Any) -> Any:
+        for part in parts:
+            if obj is None:
+                return None
+            obj = getattr(obj, part, None)
+        return obj
+
+    return accessor
+
+
+@dataclass(frozen=True)
+class CompiledMapping:
+    target_property: str
+    source_path: str
+    accessor: Accessor
+    mapper: Callable[[Any], Any] | None = None
+
+    @property
+    def signature(self) -> tuple[str, str, str | None]:
+        return (
+            self.target_property,
+            self.source_path,
+            None if self.mapper is None else get_callable_signature(self.mapper),
+        )
+
+
+MappingPlan = list[CompiledMapping]
@@ -0,0 +1,327 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Generic, TypeVar, Callable, Iterable, Sequence
+
+T = TypeVar('T')
+
+NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+NUMBER = re.compile(r'\d+')
+ROMAN_NUMERAL = re.compile(r'\b[ivx]+\b')
+
+# trigrams shared by more names than this are skipped as candidates, they hardly narrow down the match
+MAX_POSTING_FRACTION = 0.02
+MIN_POSTING_LIMIT = 64
+# candidates sharing the most selective trigrams with the name, that are scored exactly
+MAX_FUZZY_CANDIDATES = 16
+
+
+class MatchStrategy(StrEnum):
+    # identical UUIDs
+    UUID = "uuid"
+    # identical slugs
+    SLUG = "slug"
+    # identical names
+    EXACT = "exact"
+    # identical after normalizing case, accents, punctuation and spaces
+    NORMALIZED = "normalized"
+    # identical after dropping a leading word from either name, e.g. the manufacturer
+    PREFIX = "prefix"
+    # most similar name by trigrams
+    FUZZY = "fuzzy"
+
+
+STRATEGY_CONFIDENCE: dict[MatchStrategy, float] = {
+    MatchStrategy.UUID: 1.0,
+    MatchStrategy.SLUG: 1.0,
+    MatchStrategy.EXACT: 1.0,
+    MatchStrategy.NORMALIZED: 0.98,
+    MatchStrategy.PREFIX: 0.9,
+}
+
+
+@dataclass(frozen=True)
+class NameMatch(Generic[T]):
+    entry: T
+    strategy: MatchStrategy
+    # between 0 and 1, 1 being an exact match
+    confidence: float
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalizes case, accents and punctuation, e.g. `"Anvil F7C-M Super Hornet Mk II"` to `"anvil f7c m super hornet mk ii"`.
+    """
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return NON_ALPHANUMERIC.sub(' ', name.casefold()).strip()
+
+
+def get_trigrams(normalized_name: str) -> set[str]:
+    padded = f"  {normalized_name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def get_compact_name(normalized_name: str) -> str:
+    return normalized_name.replace(' ', '')
+
+
+def get_numbers(normalized_name: str) -> list[str]:
+    return NUMBER.findall(normalized_name) + ROMAN_NUMERAL.findall(normalized_name)
+
+
+class NameMatchIndex(Generic[T]):
+    """
+    Matches names against the names of the indexed entries, trying the strategies from the most to the least strict.
+    Fuzzy matching only scores entries sharing a selective trigram with the name, instead of comparing every pair,
+    so a lookup stays close to constant time regardless of the number of entries.
+    """
+
+    def __init__(self, entries: Iterable[T], key: Callable[[T], str | None],
+                 min_confidence: float = 0.85):
+        """
+        :param entries: entries to match against
+        :param key: returns the name of an entry
+        :param min_confidence: minimum trigram similarity of a fuzzy match
+        """
+        self.min_confidence = min_confidence
+        self.exact: dict[str, list[T]] = defaultdict(list)
+        self.normalized: dict[str, list[T]] = defaultdict(list)
+        # normalized name without spaces -> normalized names
+        self.compact: dict[str, set[str]] = defaultdict(set)
+        # normalized name without its first word -> normalized names
+        self.stripped: dict[str, set[str]] = defaultdict(set)
+        self.trigrams: dict[str, list[str]] = defaultdict(list)
+        self.name_trigrams: dict[str, set[str]] = {}
+
+        for entry in entries:
+            name = key(entry)
+            if not name:
+                continue
+
+            self.exact[name].append(entry)
+            self.normalized[normalize_name(name)].append(entry)
+
+        for normalized_name in self.normalized:
+            self.compact[get_compact_name(normalized_name)].add(normalized_name)
+
+            stripped_name = strip_first_word(normalized_name)
+            if stripped_name is not None:
+                self.stripped[stripped_name].add(normalized_name)
+
+            self.name_trigrams[normalized_name] = get_trigrams(normalized_name)
+            for trigram in self.name_trigrams[normalized_name]:
+                self.trigrams[trigram].append(normalized_name)
+
+        self.max_posting = max(MIN_POSTING_LIMIT, int(len(self.normalized) * MAX_POSTING_FRACTION))
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.exact.values())
+
+    def match(self, name: str | None) -> NameMatch[T] | None:
+        """
+        :return: the unambiguous match of the name, or None if there is none
+        """
+        if not name:
+            return None
+
+        if len(self.exact.get(name, [])) == 1:
+            return NameMatch(self.exact[name][0], MatchStrategy.EXACT, STRATEGY_CONFIDENCE[MatchStrategy.EXACT])
+
+        normalized_name = normalize_name(name)
+        compact_name = get_compact_name(normalized_name)
+        if compact_name in self.compact:
+            return self.unique_match(self.compact[compact_name], MatchStrategy.NORMALIZED,
+                                     STRATEGY_CONFIDENCE[MatchStrategy.NORMALIZED])
+
+        # either name may carry a leading word the other one lacks, but not both
+        prefix_candidates = set(self.stripped.get(normalized_name, ()))
+        stripped_name = strip_first_word(normalized_name)
+        if stripped_name in self.normalized:
+            prefix_candidates.add(stripped_name)
+        if prefix_candidates:
+            return self.unique_match(prefix_candidates, MatchStrategy.PREFIX, STRATEGY_CONFIDENCE[MatchStrategy.PREFIX])
+
+        return self.fuzzy_match(normalized_name)
+
+    def unique_match(self, normalized_names: Iterable[str], strategy: MatchStrategy,
+                     confidence: float) -> NameMatch[T] | None:
+        entries = [entry for normalized_name in normalized_names for entry in self.normalized[normalized_name]]
+        if len(entries) != 1:
+            # ambiguous, e.g. variants only differing in punctuation
+            return None
+
+        return NameMatch(entries[0], strategy, confidence)
+
+    def fuzzy_match(self, normalized_name: str) -> NameMatch[T] | None:
+        trigrams = get_trigrams(normalized_name)
+        shared: Counter[str] = Counter()
+
+        for trigram in trigrams:
+            posting = self.trigrams.get(trigram)
+            if posting is not None and len(posting) <= self.max_posting:
+                shared.update(posting)
+
+        best_score = 0.0
+        best_names: list[str] = []
+        numbers = get_numbers(normalized_name)
+
+        for candidate, _ in shared.most_common(MAX_FUZZY_CANDIDATES):
+            # Dice coefficient of the trigram sets
+            candidate_trigrams = self.name_trigrams[candidate]
+            score = 2 * len(trigrams & candidate_trigrams) / (len(trigrams) + len(candidate_trigrams))
+            if score < self.min_confidence or score < best_score:
+                continue
+
+            # names differing in a number, e.g. sizes or Mk II and Mk III variants, are never the same entity
+            if get_numbers(candidate) != numbers:
+                continue
+
+            if score > best_score:
+                best_score = score
+                best_names = []
+            best_names.append(candidate)
+
+        if len(best_names) == 0:
+            return None
+
+        return self.unique_match(best_names, MatchStrategy.FUZZY, round(best_score, 3))
+
+
+def strip_first_word(normalized_name: str) -> str | None:
+    _, separator, rest = normalized_name.partition(' ')
+    return rest if separator and rest else None
+
+
+# join keys from the most to the least reliable, as strategy and attribute present on both sides
+JoinKey = tuple[MatchStrategy, str]
+DEFAULT_JOIN_KEYS: list[JoinKey] = [
+    (MatchStrategy.UUID, 'uuid'),
+    (MatchStrategy.SLUG, 'slug'),
+    (MatchStrategy.EXACT, 'name'),
+]
+
+
+# strategies whose matches claim an entry over the matches of any less strict strategy
+STRICT_STRATEGIES = frozenset({MatchStrategy.UUID, MatchStrategy.SLUG, MatchStrategy.EXACT})
+STRATEGY_RANK: dict[MatchStrategy, int] = {strategy: rank for rank, strategy in enumerate(MatchStrategy)}
+
+
+@dataclass(frozen=True)
+class JoinConflict(Generic[T]):
+    # index of the rejected entity
+    index: int
+    match: NameMatch[T]
+    # index of the entity keeping the entry, None if no entity keeps it
+    claimed_by: int | None
+
+
+def normalize_join_key(strategy: MatchStrategy, value: str) -> str:
+    # names are compared as-is, the fallback index normalizes them
+    return value if strategy == MatchStrategy.EXACT else value.strip().casefold()
+
+
+class JoinIndex(Generic[T]):
+    """
+    Joins entities by the first unambiguous key of `keys`, e.g. by UUID, then slug, then name.
+    Entries sharing a key are all kept, so duplicates are reported instead of silently overwriting each other.
+    Entities without a unique key are matched by name with the fallback index.
+    """
+
+    def __init__(self, entries: Iterable[T], keys: Sequence[JoinKey] = tuple(DEFAULT_JOIN_KEYS),
+                 fallback: NameMatchIndex[T] | None = None):
+        self.keys = keys
+        self.fallback = fallback
+        self.indexes: dict[MatchStrategy, dict[str, list[T]]] = {strategy: defaultdict(list) for strategy, _ in keys}
+
+        for entry in entries:
+            for strategy, attribute in keys:
+                value = getattr(entry, attribute, None)
+                if value:
+                    self.indexes[strategy][normalize_join_key(strategy, value)].append(entry)
+
+    def get(self, strategy: MatchStrategy, value: str) -> list[T]:
+        return self.indexes[strategy].get(normalize_join_key(strategy, value), [])
+
+    def get_ambiguous_keys(self) -> dict[MatchStrategy, dict[str, int]]:
+        """
+        :return: per strategy, the keys shared by several entries and the number of entries
+        """
+        return {
+            strategy: {key: len(entries) for key, entries in index.items() if len(entries) > 1}
+            for strategy, index in self.indexes.items()
+        }
+
+    def match(self, entity: object) -> NameMatch[T] | None:
+        """
+        :param entity: entity of the other side, carrying the attributes of the join keys
+        :return: the unambiguous match of the entity, or None if there is none
+        """
+        uuid = getattr(entity, 'uuid', None)
+
+        for strategy, attribute in self.keys:
+            value = getattr(entity, attribute, None)
+            if not value:
+                continue
+
+            entries = self.get(strategy, value)
+            if len(entries) == 1:
+                return NameMatch(entries[0], strategy, STRATEGY_CONFIDENCE[strategy])
+
+        if self.fallback is None:
+            return None
+
+        match = self.fallback.match(getattr(entity, 'name', None))
+        # a similar name is no evidence against a different UUID
+        if match is None or is_conflicting(uuid, match.entry):
+            return None
+
+        return match
+
+    def match_all(self, entities: Sequence[object],
+                  is_allowed: Callable[[object, NameMatch[T]], bool] | None = None
+                  ) -> tuple[list[NameMatch[T] | None], list[JoinConflict[T]]]:
+        """
+        Matches the entities one-to-one, no entry is joined with more than one entity.
+        Entities sharing an entry are resolved by the strategy of their matches,
+        the single entity matched by the strictest strategy keeps the entry, e.g. by UUID over a fuzzy name.
+        If several entities are matched by that strategy, none of them keeps it.
+        :param is_allowed: rejects a match before it competes for its entry
+        :return: the match of every entity in the order of `entities`, None for rejected matches,
+            and the rejected matches
+        """
+        matches = [self.match(entity) for entity in entities]
+        if is_allowed is not None:
+            matches = [
+                match if match is None or is_allowed(entity, match) else None
+                for entity, match in zip(entities, matches)
+            ]
+        claimants: dict[int, list[int]] = defaultdict(list)
+
+        for index, match in enumerate(matches):
+            if match is not None:
+                claimants[id(match.entry)].append(index)
+
+        conflicts: list[JoinConflict[T]] = []
+
+        for indices in claimants.values():
+            if len(indices) == 1:
+                continue
+
+            best_rank = min(STRATEGY_RANK[matches[index].strategy] for index in indices)
+            best = [index for index in indices if STRATEGY_RANK[matches[index].strategy] == best_rank]
+            claimed_by = best[0] if len(best) == 1 else None
+
+            for index in indices:
+                if index != claimed_by:
+                    conflicts.append(JoinConflict(index, matches[index], claimed_by))
+                    matches[index] = None
+
+        return matches, sorted(conflicts, key=lambda conflict: conflict.index)
+
+
+def is_conflicting(uuid: str | None, entry: object) -> bool:
+    entry_uuid = getattr(entry, 'uuid', None)
+    return bool(uuid and entry_uuid) and uuid.strip().casefold() != entry_uuid.strip().casefold()
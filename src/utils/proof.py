@@ -0,0 +1,143 @@
+import bisect
+import functools
+import json
+from typing import Any
+
+from utils.json_index import JsonIndex, JsonSpan
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # optional, only required to render proofs without a browser
+    Image = ImageDraw = ImageFont = None
+
+PROOF_FONT_SIZE = 28
+PROOF_MARGIN = 24
+PROOF_LINE_SPACING = 8
+# lines of a multi-line value shown before it is cut off
+PROOF_MAX_VALUE_LINES = 8
+PROOF_ELLIPSIS = "..."
+
+PROOF_BACKGROUND_COLOR = "white"
+PROOF_TEXT_COLOR = "black"
+PROOF_MUTED_COLOR = "#666666"
+# the default text selection color of Chrome, like the browser rendered proofs
+PROOF_HIGHLIGHT_COLOR = "#b4d5fe"
+
+MONOSPACE_FONTS = ['DejaVuSansMono.ttf', 'consola.ttf', 'Menlo.ttc', 'cour.ttf']
+
+
+def validate_proof_rendering():
+    if Image is None:
+        raise ValueError("rendering proofs without a browser requires the 'Pillow' package")
+
+
+@functools.cache
+def get_font(size: int = PROOF_FONT_SIZE) -> 'ImageFont.FreeTypeFont | ImageFont.ImageFont':
+    for font in MONOSPACE_FONTS:
+        try:
+            return ImageFont.truetype(font, size)
+        except OSError:
+            continue
+
+    return ImageFont.load_default(size)
+
+
+class JsonProofDocument:
+    """
+    Pretty-printed JSON of a cached response, indexed once so every changed key of an update can be rendered from it.
+    """
+
+    def __init__(self, document: Any):
+        self.text = json.dumps(document, indent=4, ensure_ascii=False)
+        self.index = JsonIndex(self.text)
+        self.lines = self.text.split('\n')
+        self.line_starts = [0]
+        for line in self.lines[:-1]:
+            self.line_starts.append(self.line_starts[-1] + len(line) + 1)
+
+    def get_line(self, position: int) -> int:
+        return bisect.bisect_right(self.line_starts, position) - 1
+
+    def get_column(self, position: int) -> int:
+        return position - self.line_starts[self.get_line(position)]
+
+    def get_excerpt(self, path: str) -> list[int | None]:
+        """
+        Selects the lines opening each enclosing object of the path, followed by the lines of the value itself.
+        :return: line numbers, None where lines are left out
+        """
+        span = self.index.get(path)
+        parts = path.split('.')
+        lines = sorted({
+            self.get_line(self.index.get('.'.join(parts[:length])).start)
+            for length in range(1, len(parts))
+        })
+
+        first_line, last_line = self.get_line(span.start), self.get_line(max(span.end - 1, span.start))
+        value_lines = list(range(first_line, min(last_line, first_line + PROOF_MAX_VALUE_LINES - 1) + 1))
+
+        excerpt: list[int | None] = []
+        for line in [*lines, *value_lines]:
+            if len(excerpt) > 0 and excerpt[-1] is not None and line > excerpt[-1] + 1:
+                excerpt.append(None)
+            excerpt.append(line)
+
+        if value_lines[-1] < last_line:
+            excerpt.append(None)
+
+        return excerpt
+
+    def render(self, path: str, output_path: str, header: str | None = None) -> str | None:
+        """
+        Draws the excerpt of the path with its key and value highlighted, like a selection in the browser.
+        :param header: e.g. the source URL, drawn above the excerpt
+        :return: the output path, or None if the path is not part of the document
+        """
+        validate_proof_rendering()
+
+        span = self.index.get(path)
+        if span is None:
+            return None
+
+        font = get_font()
+        line_height = font.size + PROOF_LINE_SPACING
+        excerpt = self.get_excerpt(path)
+        rows: list[tuple[str, str, int | None]] = []
+
+        if header is not None:
+            rows.append((header, PROOF_MUTED_COLOR, None))
+        for line in excerpt:
+            if line is None:
+                rows.append((PROOF_ELLIPSIS, PROOF_MUTED_COLOR, None))
+            else:
+                rows.append((self.lines[line], PROOF_TEXT_COLOR, line))
+
+        width = int(max(font.getlength(text) for text, _, _ in rows)) + 2 * PROOF_MARGIN
+        height = len(rows) * line_height + 2 * PROOF_MARGIN - PROOF_LINE_SPACING
+        image = Image.new('RGB', (width, height), PROOF_BACKGROUND_COLOR)
+        draw = ImageDraw.Draw(image)
+
+        for row, (text, color, line) in enumerate(rows):
+            top = PROOF_MARGIN + row * line_height
+            if line is not None:
+                self.draw_highlight(draw, font, span, line, top, line_height)
+
+            draw.text((PROOF_MARGIN, top), text, fill=color, font=font)
+
+        image.save(output_path, optimize=True)
+        return output_path
+
+    def draw_highlight(self, draw: 'ImageDraw.ImageDraw', font: 'ImageFont.FreeTypeFont', span: JsonSpan,
+                       line: int, top: int, line_height: int):
+        first_line, last_line = self.get_line(span.start), self.get_line(max(span.end - 1, span.start))
+        if not first_line <= line <= last_line:
+            return
+
+        text = self.lines[line]
+        start = self.get_column(span.start) if line == first_line else len(text) - len(text.lstrip())
+        end = self.get_column(span.end) if line == last_line else len(text)
+
+        left = PROOF_MARGIN + font.getlength(text[:start])
+        right = PROOF_MARGIN + font.getlength(text[:end])
+        draw.rectangle((left, top - PROOF_LINE_SPACING // 2, right, top + line_height - PROOF_LINE_SPACING // 2),
+                       fill=PROOF_HIGHLIGHT_COLOR)
@@ -0,0 +1,27 @@
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    Spaces out `acquire` calls of all tasks sharing the limiter, so at most `per_minute` pass per minute.
+    """
+
+    def __init__(self, per_minute: float | None = None):
+        """
+        :param per_minute: maximum rate, None or 0 disables the limit
+        """
+        self.interval = 60 / per_minute if per_minute else 0.0
+        self.next_at = 0.0
+
+    async def acquire(self):
+        if not self.interval:
+            return
+
+        # reserve the next slot before sleeping, tasks acquiring meanwhile queue up behind it
+        now = time.monotonic()
+        wait = self.next_at - now
+        self.next_at = max(now, self.next_at) + self.interval
+
+        if wait > 0:
+            await asyncio.sleep(wait)